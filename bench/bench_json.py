@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from serializers import serializers
+from wuj5 import ext_unpack, ext_pack
+
+
+def measure(func, in_data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out_data = func(in_data)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, out_data
+
+
+parser = ArgumentParser()
+# Real BRLYT/BRLAN/BMG/BRCTR files, the format is given by the extension
+parser.add_argument('inputs', nargs = '+')
+parser.add_argument('--formats', nargs = '*', choices = list(serializers),
+                    default = list(serializers))
+parser.add_argument('--repeat', type = int, default = 3)
+args = parser.parse_args()
+
+for in_path in args.inputs:
+    ext = in_path.split(os.extsep)[-1]
+    with open(in_path, 'rb') as in_file:
+        in_data = in_file.read()
+    val = ext_unpack[ext](in_data)
+    print(f'{in_path}:')
+    for name in args.formats:
+        serializer = serializers[name]
+        dumps_elapsed, text = measure(lambda val: serializer.dumps(val, False), val, args.repeat)
+        loads_elapsed, loaded = measure(serializer.loads, text, args.repeat)
+        if ext_pack[ext](loaded) != in_data:
+            sys.exit(f'{name} does not round-trip {in_path}.')
+        size = len(text) if serializer.binary else len(text.encode('utf-8'))
+        print(f'    {name:6} {size:10} bytes  '
+              f'dumps {dumps_elapsed * 1e3:10.1f} ms ({size / dumps_elapsed / 1e6:7.2f} MB/s)  '
+              f'loads {loads_elapsed * 1e3:10.1f} ms ({size / loads_elapsed / 1e6:7.2f} MB/s)')
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+
+
+def run_python(args, env):
+    return subprocess.run([sys.executable, *args], cwd = root_dir, env = env, check = True,
+                          capture_output = True, text = True)
+
+def import_times(env):
+    # Lines look like 'import time:  self [us] | cumulative | imported package'
+    times = {}
+    stderr = run_python(['-X', 'importtime', '-c', 'import wuj5'], env).stderr
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(self_us), int(cumulative_us)
+    return times
+
+def measure(args, env, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_python(args, env)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+parser = ArgumentParser()
+parser.add_argument('--repeat', type = int, default = 5)
+parser.add_argument('--top', type = int, default = 10)
+# In ms, for the cumulative import time of wuj5, exits with 1 beyond it
+parser.add_argument('--budget', type = float)
+args = parser.parse_args()
+
+with tempfile.TemporaryDirectory() as pycache_dir:
+    # Cached bytecode like an installed tool has, whatever the environment says
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    env['PYTHONPYCACHEPREFIX'] = pycache_dir
+    run_python(['-c', 'import wuj5'], env)
+
+    best = None
+    for _ in range(args.repeat):
+        times = import_times(env)
+        if best is None or times['wuj5'][1] < best['wuj5'][1]:
+            best = times
+    help_elapsed = measure(['wuj5.py', '--help'], env, args.repeat)
+    bare_elapsed = measure(['-c', 'pass'], env, args.repeat)
+
+total_ms = best['wuj5'][1] / 1e3
+print(f'import wuj5:       {total_ms:8.1f} ms')
+print(f'wuj5.py --help:    {help_elapsed * 1e3:8.1f} ms '
+      f'({bare_elapsed * 1e3:.1f} ms bare interpreter)')
+print('slowest imports (cumulative, self):')
+slowest = sorted(best.items(), key = lambda item: -item[1][1])[:args.top]
+for name, (self_us, cumulative_us) in slowest:
+    print(f'    {name:32} {cumulative_us / 1e3:8.1f} ms {self_us / 1e3:8.1f} ms')
+if args.budget is not None and total_ms > args.budget:
+    sys.exit(f'import wuj5 takes {total_ms:.1f} ms, over the budget of {args.budget:.1f} ms.')
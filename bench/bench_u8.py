@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from u8 import U8Archive, unpack_u8, pack_u8
+
+
+def make_archive(dir_count, file_count, file_size):
+    root = {
+        'is_dir': True,
+        'name': '',
+        'children': [],
+    }
+    for i in range(dir_count):
+        root['children'] += [{
+            'is_dir': True,
+            'name': f'dir{i:03}',
+            'children': [{
+                'is_dir': False,
+                'name': f'file{j:05}.bin',
+                'content': bytes([j & 0xff]) * file_size,
+            } for j in range(file_count)],
+        }]
+    return pack_u8(root)
+
+def measure(func, in_data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(in_data)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+
+parser = ArgumentParser()
+parser.add_argument('--dirs', type = int, default = 8)
+parser.add_argument('--files', type = int, default = 500)
+parser.add_argument('--file-size', type = int, default = 0x400)
+parser.add_argument('--repeat', type = int, default = 3)
+args = parser.parse_args()
+
+in_data = make_archive(args.dirs, args.files, args.file_size)
+node_count = args.dirs * (args.files + 1) + 2
+print(f'archive: {node_count} nodes, {len(in_data)} bytes')
+elapsed = measure(unpack_u8, in_data, args.repeat)
+print(f'unpack_u8:  {elapsed * 1e3:8.1f} ms ({node_count / elapsed:10.0f} nodes/s)')
+elapsed = measure(U8Archive, in_data, args.repeat)
+print(f'U8Archive:  {elapsed * 1e3:8.1f} ms ({node_count / elapsed:10.0f} nodes/s)')
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+
+
+from argparse import ArgumentParser
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from fixtures import make_data
+from yaz import unpack_yaz, pack_yaz, levels
+
+
+def measure(func, in_data, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out_data = func(in_data)
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best, out_data
+
+
+parser = ArgumentParser()
+parser.add_argument('--size', type = int, default = 0x100000)
+parser.add_argument('--repeat', type = int, default = 3)
+parser.add_argument('--seed', type = int, default = 0)
+parser.add_argument('--level', choices = list(levels), default = 'max')
+parser.add_argument('--workers', type = int, default = 1)
+args = parser.parse_args()
+
+in_data = make_data(args.size, args.seed)
+elapsed, compressed = measure(lambda data: pack_yaz(data, args.level, args.workers), in_data, 1)
+print(f'pack_yaz:   {len(in_data) / elapsed / 1e6:8.3f} MB/s ({len(compressed)} bytes)')
+elapsed, out_data = measure(unpack_yaz, compressed, args.repeat)
+if out_data != in_data:
+    sys.exit('Decompressed data does not match the input.')
+print(f'unpack_yaz: {len(in_data) / elapsed / 1e6:8.3f} MB/s')
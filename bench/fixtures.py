@@ -0,0 +1,337 @@
+# Synthetic but realistic inputs for the benchmarks, generated offline from a seed. Each make_*
+# function returns the packed file and how many objects (keys, panes, messages, nodes) it holds.
+
+import os
+import random
+import struct
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir))
+
+from bmg import pack_bmg
+from brctr import pack_brctr
+from brlan import pack_brlan
+from brlyt import pack_brlyt
+from u8 import pack_u8
+
+
+def make_data(size, seed):
+    # Mimic the content of a layout archive: names, padding, small integers and floats
+    rng = random.Random(seed)
+    names = [f'Pane{i:03}'.encode('ascii') for i in range(64)]
+    out_data = bytearray()
+    while len(out_data) < size:
+        kind = rng.randrange(4)
+        if kind == 0:
+            out_data += rng.choice(names).ljust(0x10, b'\0')
+        elif kind == 1:
+            out_data += b'\0' * rng.randrange(0x4, 0x40)
+        elif kind == 2:
+            out_data += struct.pack('>HHI', rng.randrange(0x10), rng.randrange(0x100), 0xc)
+        else:
+            out_data += struct.pack('>fff', rng.randrange(600), rng.uniform(-1, 1), 0.0)
+    return bytes(out_data[:size])
+
+def make_value(rng):
+    # Values which survive the round trip through f32
+    return round(rng.uniform(-100, 100), 2)
+
+# Animation magics with the target kinds they use
+animation_kinds = {
+    'RLPA': ['translate x', 'translate y', 'rotate z', 'scale x', 'scale y'],
+    'RLVC': ['pane alpha'],
+    'RLTP': ['image'],
+}
+
+def make_brlan(pane_count, key_count, seed):
+    rng = random.Random(seed)
+    contents = []
+    total_key_count = 0
+    for i in range(pane_count):
+        animations = []
+        for magic, kinds in animation_kinds.items():
+            targets = []
+            for j, kind in enumerate(kinds):
+                if magic == 'RLTP':
+                    keys = [{
+                        'frame': float(k),
+                        'value': rng.randrange(4),
+                    } for k in range(key_count)]
+                    curve_type = 'step'
+                else:
+                    keys = [{
+                        'frame': float(2 * k),
+                        'value': make_value(rng),
+                        'slope': make_value(rng),
+                    } for k in range(key_count)]
+                    curve_type = 'hermite'
+                targets += [{
+                    'id': j,
+                    'kind': kind,
+                    'curve type': curve_type,
+                    'keys': keys,
+                }]
+                total_key_count += key_count
+            animations += [{
+                'magic': magic,
+                'targets': targets,
+            }]
+        contents += [{
+            'name': f'Pane{i:03}',
+            'kind': 'pane',
+            'animations': animations,
+        }]
+    val = {
+        'version': 10,
+        'sections': [
+            {
+                'magic': 'pat1',
+                'id': 1,
+                'groups': [{'name': 'Group00'}, {'name': 'Group01'}],
+                'name': 'anim',
+                'start frame': 0,
+                'end frame': 2 * key_count,
+                'descending bind': False,
+            },
+            {
+                'magic': 'pai1',
+                'frame count': 2 * key_count,
+                'loop': True,
+                'tpls': ['a.tpl', 'b.tpl', 'c.tpl', 'd.tpl'],
+                'contents': contents,
+            },
+        ],
+    }
+    return pack_brlan(val), total_key_count
+
+def make_material(i):
+    material = {
+        'name': f'Material{i:03}',
+    }
+    for j in range(3):
+        for channel in 'rgba':
+            material[f'tev color {j} {channel}'] = -j
+    for j in range(4):
+        for channel in 'rgba':
+            material[f'tev k color {j} {channel}'] = 0xff
+    material['attributes'] = {
+        'texture maps': [{'texture index': i % 4, 's': 0, 't': 0}],
+        'texture srts': [{
+            'translate x': 0.0,
+            'translate y': 0.0,
+            'rotate': 0.0,
+            'scale x': 1.0,
+            'scale y': 1.0,
+        }],
+        'texture uv gens': [{'type': 1, 'source': 4, 'matrix': 30}],
+        'material color': {'r': 0xff, 'g': 0xff, 'b': 0xff, 'a': 0xff},
+        'tev stages': [{
+            'uv gen': 0,
+            'color channel': 4,
+            'map': 0,
+            'swap sels': 0,
+            'color op': 0x7b,
+            'alpha op': 0x1c8,
+            'indirect': 0,
+        }] * 2,
+    }
+    return material
+
+def make_vertex_colors():
+    vertex_colors = {}
+    for corner in ['top left', 'top right', 'bottom left', 'bottom right']:
+        for channel in 'rgba':
+            vertex_colors[f'vertex color {corner} {channel}'] = 0xff
+    return vertex_colors
+
+def make_uv_set():
+    return {
+        'top left u': 0.0,
+        'top left v': 0.0,
+        'top right u': 1.0,
+        'top right v': 0.0,
+        'bottom left u': 0.0,
+        'bottom left v': 1.0,
+        'bottom right u': 1.0,
+        'bottom right v': 1.0,
+    }
+
+def make_pane(magic, name, material_count, rng):
+    pane = {
+        'magic': magic,
+        'flags': {'visible': True, 'influenced alpha': False, 'location adjust': False},
+        'base position': 'center',
+        'opacity': 0xff,
+        'name': name,
+        'user data': '',
+        'translation x': make_value(rng),
+        'translation y': make_value(rng),
+        'translation z': 0.0,
+        'rotation x': 0.0,
+        'rotation y': 0.0,
+        'rotation z': make_value(rng),
+        'scale x': 1.0,
+        'scale y': 1.0,
+        'size x': 64.0,
+        'size y': 32.0,
+    }
+    if magic == 'pic1':
+        pane.update(make_vertex_colors())
+        pane['material'] = rng.randrange(material_count)
+        pane['uv sets'] = [make_uv_set()]
+    elif magic == 'txt1':
+        pane.update({
+            'maximum string size': 0x20,
+            'string size': 0x10,
+            'material': rng.randrange(material_count),
+            'font': 0,
+            'text position': 'center',
+            'text alignment': 'left',
+            'text': 'Text',
+            'font size x': 24.0,
+            'font size y': 24.0,
+            'character space': 0.0,
+            'line space': 0.0,
+        })
+        for position in ['top', 'bottom']:
+            for channel in 'rgba':
+                pane[f'{position} color {channel}'] = 0xff
+    elif magic == 'wnd1':
+        pane.update({
+            'overlap left': 0.0,
+            'overlap right': 0.0,
+            'overlap top': 0.0,
+            'overlap bottom': 0.0,
+        })
+        pane['content'] = {
+            **make_vertex_colors(),
+            'material': rng.randrange(material_count),
+            'uv sets': [make_uv_set()],
+        }
+        pane['frames'] = [
+            {'material': rng.randrange(material_count), 'transform': 'none'},
+            {'material': rng.randrange(material_count), 'transform': 'hflip'},
+        ]
+    return pane
+
+def make_panes(depth, fan_out, material_count, rng, panes):
+    # Children are written between pas1 and pae1 sections, so depth gives nested pairs
+    children = []
+    for _ in range(fan_out):
+        magic = ['pan1', 'pic1', 'txt1', 'wnd1', 'bnd1'][len(panes) % 5]
+        pane = make_pane(magic, f'Pane{len(panes):04}', material_count, rng)
+        panes += [pane]
+        if depth > 1:
+            pane['children'] = make_panes(depth - 1, fan_out, material_count, rng, panes)
+        children += [pane]
+    return children
+
+def make_brlyt(depth, fan_out, seed):
+    rng = random.Random(seed)
+    material_count = 32
+    root = make_pane('pan1', 'RootPane', material_count, rng)
+    panes = [root]
+    root['children'] = make_panes(depth, fan_out, material_count, rng, panes)
+    val = {
+        'version': 10,
+        'sections': [
+            {'magic': 'lyt1', 'centered': True, 'size x': 608.0, 'size y': 456.0},
+            {'magic': 'txl1', 'tpls': [{'name': f'{c}.tpl'} for c in 'abcd']},
+            {'magic': 'fnl1', 'brfnts': [{'name': 'a.brfnt'}]},
+            {'magic': 'mat1', 'materials': [make_material(i) for i in range(material_count)]},
+            root,
+            {'magic': 'grp1', 'name': 'RootGroup', 'panes': [], 'children': [{
+                'magic': 'grp1',
+                'name': f'Group{i:02}',
+                'panes': [{'name': pane['name']} for pane in panes[1 + i::16]],
+            } for i in range(16)]},
+        ],
+    }
+    return pack_brlyt(val), len(panes)
+
+# Messages mix plain text with the escape sequences of bmg.py
+message_templates = [
+    'Plain text',
+    'Hello {color|red}world{color|unspecified}!',
+    'Finished in {arg integer|1 3} place.',
+    '{font scale|150}Big{font scale|100} text, ¡ünïcödé!',
+]
+
+def make_bmg(message_count, seed):
+    rng = random.Random(seed)
+    messages = {}
+    for i in range(message_count):
+        string = ' '.join(rng.choice(message_templates) for _ in range(rng.randrange(1, 4)))
+        messages[hex(0x1000 + i)] = {
+            'font': 'regular',
+            'string': string,
+        }
+    return pack_bmg(messages), message_count
+
+def make_brctr(entry_count):
+    val = {
+        'main brlyt': 'main',
+        'bmg': 'message',
+        'picture source brlyt': 'picture',
+        'groups': [{
+            'name': f'Group{i:02}',
+            'pane': 'RootPane',
+            'first animation': i,
+            'animation count': 1,
+        } for i in range(entry_count)],
+        'animations': [{
+            'name': f'Animation{i:02}',
+            'brlan': f'main_{i:02}',
+            'next': '',
+            'reversed': False,
+            'speed': 1.0,
+        } for i in range(entry_count)],
+        'variants': [{
+            'name': 'Variant',
+            'opacity': 0xff,
+            'animated': False,
+            'animation delay': 0.0,
+            'first message': 0,
+            'message count': 1,
+            'first picture': 0,
+            'picture count': 1,
+            **{
+                f'{field} {ratio}': 1.0
+                for field in ['translation x', 'translation y', 'translation z', 'scale x',
+                              'scale y']
+                for ratio in ['4:3', '16:9']
+            },
+        }],
+        'messages': [{'pane': 'Text', 'name': 'Message', 'message id': 0x1000}],
+        'pictures': [{'destination pane': 'Destination', 'source pane': 'Source'}],
+    }
+    return pack_brctr(val), 2 * entry_count + 3
+
+def make_archive(scale, seed):
+    # The layout of a menu archive: one layout, a few animations, a control and messages
+    brlyt_data, _ = make_brlyt(3, max(round(6 * scale), 1), seed)
+    brlan_count = max(round(24 * scale), 1)
+    brlan_data = [make_brlan(10, 120, seed + i)[0] for i in range(brlan_count)]
+    brctr_data, _ = make_brctr(8)
+    bmg_data, _ = make_bmg(max(round(500 * scale), 1), seed)
+    dirs = {
+        'anim': [(f'main_{i:02}.brlan', data) for i, data in enumerate(brlan_data)],
+        'blyt': [('main.brlyt', brlyt_data)],
+        'ctrl': [('main.brctr', brctr_data)],
+        'message': [('main.bmg', bmg_data), ('raw.bin', make_data(0x8000, seed))],
+    }
+    root = {
+        'is_dir': True,
+        'name': '',
+        'children': [{
+            'is_dir': True,
+            'name': name,
+            'children': [{
+                'is_dir': False,
+                'name': child_name,
+                'content': content,
+            } for child_name, content in children],
+        } for name, children in dirs.items()],
+    }
+    node_count = 1 + len(dirs) + sum(len(children) for children in dirs.values())
+    return pack_u8(root), node_count
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+
+
+# Times unpack and pack of every format, U8, Yaz0 at each level and wuj5.py end to end on the
+# fixtures of fixtures.py, and writes the throughputs as JSON so that runs can be compared
+
+
+from argparse import ArgumentParser
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
+sys.path.insert(0, root_dir)
+
+from fixtures import make_archive, make_bmg, make_brctr, make_brlan, make_brlyt
+from serializers import serializers
+from u8 import pack_u8, unpack_u8
+from wuj5 import ext_pack, ext_unpack
+from yaz import levels, pack_yaz, unpack_yaz
+
+
+def measure(func, repeat, setup = None):
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - start
+        if best is None or elapsed < best:
+            best = elapsed
+    return best
+
+def make_result(elapsed, size, object_count):
+    result = {
+        'seconds': elapsed,
+        'bytes': size,
+        'MB/s': size / elapsed / 1e6,
+    }
+    if object_count is not None:
+        result['objects'] = object_count
+        result['objects/s'] = object_count / elapsed
+    return result
+
+def make_fixtures(scale, seed):
+    # ext: (data, object count), sized so that the default scale runs in a few minutes
+    return {
+        'brlan': make_brlan(max(round(16 * scale), 1), 200, seed),
+        'brlyt': make_brlyt(4, max(round(6 * scale), 1), seed),
+        'bmg': make_bmg(max(round(4000 * scale), 1), seed),
+        'brctr': make_brctr(8),
+    }
+
+def run_cli(*args):
+    subprocess.run([sys.executable, os.path.join(root_dir, 'wuj5.py'), *args], check = True,
+                   stdout = subprocess.DEVNULL)
+
+def remove(path):
+    if os.path.isdir(path):
+        shutil.rmtree(path)
+    elif os.path.exists(path):
+        os.remove(path)
+
+def is_selected(name, selected):
+    return selected is None or any(name.startswith(prefix) for prefix in selected)
+
+def run_benchmarks(args, results):
+    def add(name, func, size, object_count, setup = None):
+        if not is_selected(name, args.benchmarks):
+            return
+        elapsed = measure(func, args.repeat, setup)
+        results[name] = make_result(elapsed, size, object_count)
+        print(f'{name:24} {elapsed * 1e3:10.1f} ms {results[name]["MB/s"]:8.2f} MB/s',
+              file = sys.stderr)
+
+    fixtures = make_fixtures(args.scale, args.seed)
+    for ext, (in_data, object_count) in fixtures.items():
+        # Packers are given what the text formats load, where keys are strings
+        val = json.loads(json.dumps(ext_unpack[ext](in_data)))
+        if ext_pack[ext](val) != in_data:
+            sys.exit(f'The {ext} fixture does not round-trip.')
+        add(f'unpack_{ext}', lambda: ext_unpack[ext](in_data), len(in_data), object_count)
+        add(f'pack_{ext}', lambda: ext_pack[ext](val), len(in_data), object_count)
+
+    archive_data, node_count = make_archive(args.scale, args.seed)
+    root = unpack_u8(archive_data)
+    add('unpack_u8', lambda: unpack_u8(archive_data), len(archive_data), node_count)
+    add('pack_u8', lambda: pack_u8(root), len(archive_data), node_count)
+
+    # The whole archive takes several seconds per level, a prefix of it is enough to compare
+    yaz_data = archive_data[:args.yaz_size]
+    for level in levels:
+        add(f'pack_yaz_{level}', lambda: pack_yaz(yaz_data, level), len(yaz_data), None)
+    compressed = pack_yaz(yaz_data, 'fast')
+    add('unpack_yaz', lambda: unpack_yaz(compressed), len(yaz_data), None)
+
+    if not any(is_selected(name, args.benchmarks) for name in ['cli_decode', 'cli_encode']):
+        return
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        szs_path = os.path.join(tmp_dir, 'bench.szs')
+        with open(szs_path, 'wb') as out_file:
+            out_file.write(pack_yaz(archive_data, 'fast'))
+        brlan_path = os.path.join(tmp_dir, 'bench.brlan')
+        with open(brlan_path, 'wb') as out_file:
+            out_file.write(fixtures['brlan'][0])
+        text_ext = serializers[args.cli_format].ext
+        # Whole runs, startup included, like a user invoking the tool
+        for path, size, object_count in [
+            (szs_path, len(archive_data), node_count),
+            (brlan_path, len(fixtures['brlan'][0]), fixtures['brlan'][1]),
+        ]:
+            ext = path.split(os.extsep)[-1]
+            decoded_path = path + ('.d' if ext == 'szs' else os.extsep + text_ext)
+            encoded_path = os.path.join(tmp_dir, 'encoded' + os.extsep + ext)
+            add(f'cli_decode_{ext}',
+                lambda: run_cli('decode', path, '-o', decoded_path, '--format', args.cli_format),
+                size, object_count, lambda: remove(decoded_path))
+            if not os.path.exists(decoded_path):
+                run_cli('decode', path, '-o', decoded_path, '--format', args.cli_format)
+            add(f'cli_encode_{ext}', lambda: run_cli('encode', decoded_path, '-o', encoded_path),
+                size, object_count)
+
+
+parser = ArgumentParser()
+parser.add_argument('--scale', type = float, default = 1.0)
+parser.add_argument('--repeat', type = int, default = 3)
+parser.add_argument('--seed', type = int, default = 0)
+parser.add_argument('--yaz-size', type = int, default = 0x80000)
+parser.add_argument('--cli-format', choices = list(serializers), default = 'json')
+# Prefixes of the benchmarks to run, e.g. pack_yaz or cli
+parser.add_argument('--benchmarks', nargs = '*')
+parser.add_argument('-o', '--output')
+# A previous output, the change of each throughput is printed against it
+parser.add_argument('--baseline')
+args = parser.parse_args()
+
+results = {}
+run_benchmarks(args, results)
+report = {
+    'python': platform.python_version(),
+    'machine': platform.machine(),
+    'scale': args.scale,
+    'seed': args.seed,
+    'results': results,
+}
+if args.output is None:
+    print(json.dumps(report, indent = 4))
+else:
+    with open(args.output, 'w', encoding = 'utf-8') as out_file:
+        json.dump(report, out_file, indent = 4)
+
+if args.baseline is not None:
+    with open(args.baseline, 'r', encoding = 'utf-8') as in_file:
+        baseline = json.load(in_file)['results']
+    for name, result in results.items():
+        if name in baseline:
+            change = result['MB/s'] / baseline[name]['MB/s'] - 1
+            print(f'{name:24} {baseline[name]["MB/s"]:8.2f} -> {result["MB/s"]:8.2f} MB/s '
+                  f'({change:+.1%})', file = sys.stderr)
@@ -0,0 +1,174 @@
+# A subset of MessagePack: nil, bool, int, float 64, str, array and map, which is all the value
+# trees of the converters need. Map keys are written as strings like JSON does, so that values
+# read back are the same as the ones read from JSON5.
+
+import struct
+
+
+u8_struct = struct.Struct('>B')
+u16_struct = struct.Struct('>H')
+u32_struct = struct.Struct('>I')
+u64_struct = struct.Struct('>Q')
+s8_struct = struct.Struct('>b')
+s16_struct = struct.Struct('>h')
+s32_struct = struct.Struct('>i')
+s64_struct = struct.Struct('>q')
+f64_struct = struct.Struct('>d')
+
+def dump_int(val, out_data):
+    if 0x0 <= val < 0x80:
+        out_data.append(val)
+    elif -0x20 <= val < 0x0:
+        out_data.append(val & 0xff)
+    elif 0x0 <= val:
+        if val <= 0xff:
+            out_data += b'\xcc' + u8_struct.pack(val)
+        elif val <= 0xffff:
+            out_data += b'\xcd' + u16_struct.pack(val)
+        elif val <= 0xffffffff:
+            out_data += b'\xce' + u32_struct.pack(val)
+        else:
+            out_data += b'\xcf' + u64_struct.pack(val)
+    else:
+        if val >= -0x80:
+            out_data += b'\xd0' + s8_struct.pack(val)
+        elif val >= -0x8000:
+            out_data += b'\xd1' + s16_struct.pack(val)
+        elif val >= -0x80000000:
+            out_data += b'\xd2' + s32_struct.pack(val)
+        else:
+            out_data += b'\xd3' + s64_struct.pack(val)
+
+def dump_str(val, out_data):
+    val = val.encode('utf-8')
+    size = len(val)
+    if size < 0x20:
+        out_data.append(0xa0 | size)
+    elif size <= 0xff:
+        out_data += b'\xd9' + u8_struct.pack(size)
+    elif size <= 0xffff:
+        out_data += b'\xda' + u16_struct.pack(size)
+    else:
+        out_data += b'\xdb' + u32_struct.pack(size)
+    out_data += val
+
+def dump_header(size, fix_code, code16, code32, out_data):
+    if size < 0x10:
+        out_data.append(fix_code | size)
+    elif size <= 0xffff:
+        out_data += code16 + u16_struct.pack(size)
+    else:
+        out_data += code32 + u32_struct.pack(size)
+
+def dump_val(val, out_data, default):
+    # bool before int since it is a subclass of it
+    if val is None:
+        out_data.append(0xc0)
+    elif val is False:
+        out_data.append(0xc2)
+    elif val is True:
+        out_data.append(0xc3)
+    elif isinstance(val, int):
+        dump_int(val, out_data)
+    elif isinstance(val, float):
+        out_data += b'\xcb' + f64_struct.pack(val)
+    elif isinstance(val, str):
+        dump_str(val, out_data)
+    elif isinstance(val, (list, tuple)):
+        dump_header(len(val), 0x90, b'\xdc', b'\xdd', out_data)
+        for entry in val:
+            dump_val(entry, out_data, default)
+    elif isinstance(val, dict):
+        dump_header(len(val), 0x80, b'\xde', b'\xdf', out_data)
+        for key, entry in val.items():
+            dump_str(key if isinstance(key, str) else str(key), out_data)
+            dump_val(entry, out_data, default)
+    elif default is not None:
+        # Like the default of json.dumps, converts what is not supported into what is
+        dump_val(default(val), out_data, default)
+    else:
+        raise TypeError(f'Unsupported value of type {type(val).__name__}.')
+
+def dumps_bin(val, default = None):
+    out_data = bytearray()
+    dump_val(val, out_data, default)
+    return out_data
+
+# Codes with a fixed size payload: (struct, size)
+fixed_codes = {
+    0xca: (struct.Struct('>f'), 0x4),
+    0xcb: (f64_struct, 0x8),
+    0xcc: (u8_struct, 0x1),
+    0xcd: (u16_struct, 0x2),
+    0xce: (u32_struct, 0x4),
+    0xcf: (u64_struct, 0x8),
+    0xd0: (s8_struct, 0x1),
+    0xd1: (s16_struct, 0x2),
+    0xd2: (s32_struct, 0x4),
+    0xd3: (s64_struct, 0x8),
+}
+
+# Codes followed by a length: (struct, size, kind)
+sized_codes = {
+    0xc4: (u8_struct, 0x1, 'bin'),
+    0xc5: (u16_struct, 0x2, 'bin'),
+    0xc6: (u32_struct, 0x4, 'bin'),
+    0xd9: (u8_struct, 0x1, 'str'),
+    0xda: (u16_struct, 0x2, 'str'),
+    0xdb: (u32_struct, 0x4, 'str'),
+    0xdc: (u16_struct, 0x2, 'array'),
+    0xdd: (u32_struct, 0x4, 'array'),
+    0xde: (u16_struct, 0x2, 'map'),
+    0xdf: (u32_struct, 0x4, 'map'),
+}
+
+def load_val(in_data, offset):
+    code = in_data[offset]
+    offset += 0x1
+    if code < 0x80:
+        return code, offset
+    if code >= 0xe0:
+        return code - 0x100, offset
+    if code < 0x90:
+        kind, size = 'map', code & 0xf
+    elif code < 0xa0:
+        kind, size = 'array', code & 0xf
+    elif code < 0xc0:
+        kind, size = 'str', code & 0x1f
+    elif code == 0xc0:
+        return None, offset
+    elif code == 0xc2:
+        return False, offset
+    elif code == 0xc3:
+        return True, offset
+    elif code in fixed_codes:
+        code_struct, code_size = fixed_codes[code]
+        return code_struct.unpack_from(in_data, offset)[0], offset + code_size
+    elif code in sized_codes:
+        code_struct, code_size, kind = sized_codes[code]
+        size = code_struct.unpack_from(in_data, offset)[0]
+        offset += code_size
+    else:
+        raise ValueError(f'Unsupported code {code:#x} at offset {offset - 0x1:#x}.')
+
+    if kind == 'str':
+        return str(in_data[offset:offset + size], 'utf-8'), offset + size
+    if kind == 'bin':
+        return bytes(in_data[offset:offset + size]), offset + size
+    if kind == 'array':
+        val = []
+        for _ in range(size):
+            entry, offset = load_val(in_data, offset)
+            val.append(entry)
+        return val, offset
+    val = {}
+    for _ in range(size):
+        key, offset = load_val(in_data, offset)
+        val[key], offset = load_val(in_data, offset)
+    return val, offset
+
+def loads_bin(in_data):
+    val, offset = load_val(in_data, 0x0)
+    if offset != len(in_data):
+        raise ValueError(f'Trailing data at offset {offset:#x}.')
+    return val
@@ -3,16 +3,16 @@ import sys
 from common import *
 
 
-font_variants = [
+font_variants = Enum([
     Variant('caps', 0x0), # tt_kart_font_rodan_ntlg_pro_b.brfnt
     Variant('regular', 0x1), # kart_kanji_font.brfnt / kart_font_korea.brfnt
     Variant('extension', 0x2), # tt_kart_extension_font.brfnt
     Variant('indicator', 0x3), # indicator_font.brfnt
     Variant('red', 0x4), # mario_font_number_red.brfnt
     Variant('blue', 0x5), # mario_font_number_blue.brfnt
-]
+])
 
-tag_variants = [
+tag_variants = Enum([
     # The font scale as an integer percentage.
     Variant('font scale', 0x08000000),
     # The color of the text.
@@ -45,9 +45,9 @@ tag_variants = [
     Variant('arg front button', 0x08030010),
     # From `intVals`, second message if 1, otherwise first.
     Variant('arg cond messages', 0x0c040000),
-]
+])
 
-color_variants = [
+color_variants = Enum([
     Variant('unspecified', 0x0),
     Variant('transparent', 0x8),
     Variant('yor 0', 0x10),
@@ -68,7 +68,7 @@ color_variants = [
     Variant('sp green', 0x50),
     Variant('sp blue', 0x51),
     Variant('sp pink', 0x52),
-]
+])
 
 def unpack_inf1(in_data, offset):
     entry_count = unpack_u16(in_data, offset + 0x08)
@@ -97,23 +97,7 @@ def unpack_mid1(in_data, offset):
         entries += [unpack_u32(in_data, offset + 0x10 + i * 0x4)]
     return entries
 
-def unpack_bmg(in_data):
-    offset = 0x20
-    sections = {}
-    while offset < len(in_data):
-        magic = unpack_magic(in_data, offset + 0x00)
-        size = unpack_u32(in_data, offset + 0x04)
-        if magic in sections:
-            sys.exit(f'Duplicate bmg section {magic}.')
-        section = {
-            'INF1': unpack_inf1,
-            'DAT1': unpack_dat1,
-            'MID1': unpack_mid1,
-        }[magic](in_data, offset)
-        sections[magic] = section
-        offset += size
-
-    messages = {}
+def iter_messages(sections):
     for index, message_id in enumerate(sections['MID1']):
         inf1 = sections['INF1']
         font = inf1[index]['font']
@@ -142,7 +126,7 @@ def unpack_bmg(in_data):
                             variants = color_variants,
                         )
                     elif tag == '1 char':
-                        val = dat1[offset + 0x6:offset + 0x6 + 0x2].decode('utf-16-be')
+                        val = bytes(dat1[offset + 0x6:offset + 0x6 + 0x2]).decode('utf-16-be')
                     elif tag == 'current player':
                         val = ''
                     elif tag == 'arg integer' or tag == 'arg signed integer':
@@ -150,8 +134,8 @@ def unpack_bmg(in_data):
                         digits = unpack_u16(dat1, offset + 0x8)
                         val = f'{index} {digits}'
                     elif tag == '2 chars':
-                        c0 = dat1[offset + 0x6:offset + 0x6 + 0x4].decode('utf-16-be')
-                        c1 = dat1[offset + 0xa:offset + 0xa + 0x4].decode('utf-16-be')
+                        c0 = bytes(dat1[offset + 0x6:offset + 0x6 + 0x4]).decode('utf-16-be')
+                        c1 = bytes(dat1[offset + 0xa:offset + 0xa + 0x4]).decode('utf-16-be')
                         val = f'{c0} {c1}'
                     elif tag == 'arg cond messages':
                         index = unpack_u16(dat1, offset + 0x6)
@@ -163,26 +147,45 @@ def unpack_bmg(in_data):
                     string += f'{{{tag}|{val}}}'
                     offset += unpack_u8(dat1, offset + 0x2)
                 else:
-                    string += dat1[offset:offset + 0x2].decode('utf-16-be')
+                    string += bytes(dat1[offset:offset + 0x2]).decode('utf-16-be')
                     offset += 0x2
-        messages[message_id] = {
+        yield message_id, {
             'font': font,
             'string': string,
         }
-    return messages
+
+def unpack_bmg(in_data, lazy = False):
+    # When lazy, messages are produced on demand for streaming serializers
+    offset = 0x20
+    sections = {}
+    while offset < len(in_data):
+        magic = unpack_magic(in_data, offset + 0x00)
+        size = unpack_u32(in_data, offset + 0x04)
+        if magic in sections:
+            sys.exit(f'Duplicate bmg section {magic}.')
+        section = {
+            'INF1': unpack_inf1,
+            'DAT1': unpack_dat1,
+            'MID1': unpack_mid1,
+        }[magic](in_data, offset)
+        sections[magic] = section
+        offset += size
+
+    messages = iter_messages(sections)
+    if lazy:
+        return Items(messages)
+    return dict(messages)
 
 def pack_inf1(entries):
-    entries_data = b''
-    for entry in entries:
-        entries_data += b''.join([
-            pack_u32(entry['string offset']),
-            pack_enum8(
-                entry['font'],
-                pack = pack,
-                variants = font_variants,
-            ),
-            pack_pad24(None),
-        ])
+    entries_data = b''.join(b''.join([
+        pack_u32(entry['string offset']),
+        pack_enum8(
+            entry['font'],
+            pack = pack,
+            variants = font_variants,
+        ),
+        pack_pad24(None),
+    ]) for entry in entries)
 
     return b''.join([
         pack_magic('INF1'),
@@ -201,9 +204,7 @@ def pack_dat1(strings_data):
     ])
 
 def pack_mid1(entries):
-    entries_data = b''
-    for entry in entries:
-        entries_data += pack_u32(entry)
+    entries_data = struct.pack(f'>{len(entries)}I', *entries)
 
     return b''.join([
         pack_magic('MID1'),
@@ -219,51 +220,51 @@ def pack_bmg(messages):
     inf1 = []
     mid1 = []
     strings = Buffer(0x0)
-    strings.buffer = b'\0\0'
+    strings.push(b'\0\0')
     for message_id in messages:
         in_string = messages[message_id]['string']
         if in_string is None:
             string_offset = 0x0
         else:
-            out_string = b''
+            out_string = []
             parts = in_string.split('{', maxsplit = 1)
             while len(parts) > 1:
-                out_string += parts[0].encode('utf-16-be')
+                out_string += [parts[0].encode('utf-16-be')]
                 pattern, in_string = parts[1].split('}', maxsplit = 1)
-                out_string += pack_u16(0x1a)
+                out_string += [pack_u16(0x1a)]
                 tag, val = pattern.split('|')
-                out_string += pack_enum32(
+                out_string += [pack_enum32(
                     tag,
                     pack = pack,
                     variants = tag_variants,
-                )
+                )]
                 if tag == 'color':
-                    out_string += pack_enum16(
+                    out_string += [pack_enum16(
                         val,
                         pack = pack,
                         variants = color_variants,
-                    )
+                    )]
                 elif tag == '1 char':
-                    out_string += val.encode('utf-16-be')
+                    out_string += [val.encode('utf-16-be')]
                 elif tag == 'arg integer' or tag == 'arg signed integer':
                     index, digits = val.split(' ')
-                    out_string += pack_u16(int(index))
-                    out_string += pack_u16(int(digits))
+                    out_string += [pack_u16(int(index))]
+                    out_string += [pack_u16(int(digits))]
                 elif tag == '2 chars':
                     c0, c1 = val.split(' ')
-                    out_string += c0.encode('utf-16-be')
-                    out_string += c1.encode('utf-16-be')
+                    out_string += [c0.encode('utf-16-be')]
+                    out_string += [c1.encode('utf-16-be')]
                 elif tag == 'arg cond messages':
                     index, m0, m1 = val.split(' ')
-                    out_string += pack_u16(int(index))
-                    out_string += pack_u16(int(m0))
-                    out_string += pack_u16(int(m1))
+                    out_string += [pack_u16(int(index))]
+                    out_string += [pack_u16(int(m0))]
+                    out_string += [pack_u16(int(m1))]
                 elif tag != 'current player':
-                    out_string += pack_u16(int(val))
+                    out_string += [pack_u16(int(val))]
                 parts = in_string.split('{', maxsplit = 1)
-            out_string += in_string.encode('utf-16-be')
-            out_string += b'\0\0'
-            string_offset = strings.push(out_string)
+            out_string += [in_string.encode('utf-16-be')]
+            out_string += [b'\0\0']
+            string_offset = strings.push(b''.join(out_string))
         inf1 += [{
             'string offset': string_offset,
             'font': messages[message_id]['font'],
@@ -276,16 +277,16 @@ def pack_bmg(messages):
         'MID1': mid1,
     }
 
-    sections_data = b''
+    sections_data = Buffer(0x0)
     for magic in sections:
-        section_data = {
+        section_offset = sections_data.push({
             'INF1': pack_inf1,
             'DAT1': pack_dat1,
             'MID1': pack_mid1,
-        }[magic](sections[magic])
-        section_data = section_data.ljust((len(section_data) + 0x1f) & ~0x1f, b'\0')
-        section_data = section_data[0x0:0x4] + pack_u32(len(section_data)) + section_data[0x8:]
-        sections_data += section_data
+        }[magic](sections[magic]))
+        sections_data.align(0x20)
+        sections_data.patch(section_offset + 0x4, pack_u32(sections_data.size() - section_offset))
+    sections_data = sections_data.buffer
 
     return b''.join([
         pack_magic('MESG'),
@@ -4,7 +4,7 @@ from common import *
 def unpack_string(in_data, offset, **kwargs):
     strings_offset = kwargs['strings_offset']
     offset = strings_offset + unpack_u16(in_data, offset)
-    return in_data[offset:].split(b'\0')[0].decode('ascii')
+    return unpack_cstring(in_data, offset)
 
 def unpack_array(in_data, offset, **kwargs):
     size = kwargs['size']
@@ -95,6 +95,12 @@ variant_fields = [
     ]),
 ]
 
+def compile_schemas():
+    # get_schema compiles on first use, the server calls this once before forking its jobs
+    for fields in [group_fields, variant_fields]:
+        get_schema(fields, brctr_size, unpack = brctr_unpack)
+        get_schema(fields, brctr_size, pack = brctr_pack)
+
 def unpack_brctr(in_data):
     strings_offset = unpack_u16(in_data, 0x10)
     group_offset = unpack_u16(in_data, 0x0c)
@@ -113,32 +119,35 @@ def unpack_brctr(in_data):
 def pack_brctr(val):
     strings = Strings('ascii', b'\0')
 
-    header_data = b''.join([
+    out_data = Buffer(0x0)
+    out_data.push(b''.join([
         pack_magic('bctr'),
         pack_u16(2),
         pack_string(val['main brlyt'], strings = strings),
         pack_string(val['bmg'], strings = strings),
         pack_string(val['picture source brlyt'], strings = strings),
-    ])
+        pack_pad16(None),
+        pack_pad16(None),
+        pack_pad16(None),
+        pack_pad16(None),
+    ]))
 
     group_val = { field.name: val[field.name] for field in group_fields }
     buffer = Buffer(sum(brctr_size[field.kind] for field in group_fields))
-    group_data = pack_struct(group_val, size = brctr_size, pack = brctr_pack,
-                                 fields = group_fields, buffer = buffer, strings = strings)
-    group_data += buffer.buffer
+    group_offset = out_data.push(pack_struct(group_val, size = brctr_size, pack = brctr_pack,
+                                             fields = group_fields, buffer = buffer,
+                                             strings = strings))
+    out_data.push(buffer.buffer)
 
     buffer = Buffer(sum(brctr_size[field.kind] for field in variant_fields))
     variant_val = { field.name: val[field.name] for field in variant_fields }
-    variant_data = pack_struct(variant_val, size = brctr_size, pack = brctr_pack,
-                              fields = variant_fields, buffer = buffer, strings = strings)
-    variant_data += buffer.buffer
-
-    offset = 0x14
-    header_data += pack_u16(offset)
-    offset += len(group_data)
-    header_data += pack_u16(offset)
-    offset += len(variant_data)
-    header_data += pack_u16(offset)
-    header_data += pack_pad16(None)
-
-    return header_data + group_data + variant_data + strings.buffer
+    variant_offset = out_data.push(pack_struct(variant_val, size = brctr_size, pack = brctr_pack,
+                                               fields = variant_fields, buffer = buffer,
+                                               strings = strings))
+    out_data.push(buffer.buffer)
+
+    strings_offset = out_data.push(strings.buffer)
+    out_data.patch(0x0c, pack_u16(group_offset))
+    out_data.patch(0x0e, pack_u16(variant_offset))
+    out_data.patch(0x10, pack_u16(strings_offset))
+    return out_data.buffer
@@ -1,8 +1,13 @@
+from array import array
+from bisect import bisect_right
+from importlib.util import find_spec
+import struct
+
 from common import *
 
 
 target_kind_variants = {
-    'RLMC': [
+    'RLMC': Enum([
         Variant('material color r', 0x00),
         Variant('material color g', 0x01),
         Variant('material color b', 0x02),
@@ -35,8 +40,8 @@ target_kind_variants = {
         Variant('tev konst 3 color g', 0x1d),
         Variant('tev konst 3 color b', 0x1e),
         Variant('tev konst 3 color a', 0x1f),
-    ],
-    'RLPA': [
+    ]),
+    'RLPA': Enum([
         Variant('translate x', 0x0),
         Variant('translate y', 0x1),
         Variant('translate z', 0x2),
@@ -47,19 +52,19 @@ target_kind_variants = {
         Variant('scale y', 0x7),
         Variant('size w', 0x8),
         Variant('size h', 0x9),
-    ],
-    'RLTP': [
+    ]),
+    'RLTP': Enum([
         Variant('image', 0x0),
         Variant('palette', 0x1),
-    ],
-    'RLTS': [
+    ]),
+    'RLTS': Enum([
         Variant('translate s', 0x0),
         Variant('translate t', 0x1),
         Variant('rotate', 0x2),
         Variant('scale s', 0x3),
         Variant('scale t', 0x4),
-    ],
-    'RLVC': [
+    ]),
+    'RLVC': Enum([
         Variant('top left r', 0x00),
         Variant('top left g', 0x01),
         Variant('top left b', 0x02),
@@ -77,26 +82,26 @@ target_kind_variants = {
         Variant('bottom right b', 0x0e),
         Variant('bottom right a', 0x0f),
         Variant('pane alpha', 0x10),
-    ],
-    'RLVI': [
+    ]),
+    'RLVI': Enum([
         Variant('visibility', 0x0),
-    ],
+    ]),
 }
 
-curve_type_variants = [
+curve_type_variants = Enum([
     Variant('constant', 0x0),
     Variant('step', 0x1),
     Variant('hermite', 0x2),
-]
+])
 
-content_kind_variants = [
+content_kind_variants = Enum([
     Variant('pane', 0x0),
     Variant('material', 0x1),
-]
+])
 
-def unpack_pat1(in_data, offset):
+def unpack_pat1(in_data, offset, **kwargs):
     name_offset = offset + unpack_u32(in_data, offset + 0x0c)
-    name = in_data[name_offset:].split(b'\0')[0].decode('ascii')
+    name = unpack_cstring(in_data, name_offset)
 
     group_count = unpack_u16(in_data, offset + 0x0a)
     groups_offset = unpack_u32(in_data, offset + 0x10)
@@ -104,7 +109,7 @@ def unpack_pat1(in_data, offset):
     for i in range(group_count):
         group_offset = offset + groups_offset + i * 0x14
         groups += [{
-            'name': in_data[group_offset:group_offset + 0x10].decode('ascii').rstrip('\0')
+            'name': bytes(in_data[group_offset:group_offset + 0x10]).decode('ascii').rstrip('\0')
         }]
 
     return {
@@ -117,20 +122,174 @@ def unpack_pat1(in_data, offset):
         'descending bind': unpack_bool8(in_data, offset + 0x18),
     }
 
-def unpack_step_key(in_data, offset):
-    return {
-        'frame': unpack_f32(in_data, offset + 0x0),
-        'value': unpack_u16(in_data, offset + 0x4),
-    }
+# Keys are read and written a whole target at a time, with NumPy when it is installed. It is only
+# imported once a BRLAN is, like the other optional backends.
+has_numpy = find_spec('numpy') is not None
 
-def unpack_hermite_key(in_data, offset):
-    return {
-        'frame': unpack_f32(in_data, offset + 0x0),
-        'value': unpack_f32(in_data, offset + 0x4),
-        'slope': unpack_f32(in_data, offset + 0x8),
-    }
+key_names = {
+    'step': ['frame', 'value'],
+    'hermite': ['frame', 'value', 'slope'],
+}
+
+key_structs = {
+    'step': struct.Struct('>fH2x'),
+    'hermite': struct.Struct('>fff'),
+}
 
-def unpack_target(in_data, offset, magic):
+key_dtypes = {
+    'step': {
+        'names': ['frame', 'value'],
+        'formats': ['>f4', '>u2'],
+        'offsets': [0x0, 0x4],
+        'itemsize': 0x8,
+    },
+    'hermite': {
+        'names': ['frame', 'value', 'slope'],
+        'formats': ['>f4', '>f4', '>f4'],
+    },
+}
+
+def unpack_key_columns(in_data, offset, key_count, curve_type):
+    import numpy
+
+    keys = numpy.frombuffer(in_data, key_dtypes[curve_type], key_count, offset)
+    columns = []
+    for name in key_names[curve_type]:
+        column = keys[name]
+        if column.dtype.kind == 'f':
+            # x * 1e6 is exact in f64 for any f32 x, so this is the same as round(x, 6)
+            column = numpy.rint(column.astype(numpy.float64) * 1e6) / 1e6
+        else:
+            column = column.astype(numpy.uint16)
+        columns += [column]
+    return columns
+
+def unpack_keys(in_data, offset, key_count, curve_type):
+    # Floats are rounded like unpack_f32, either by NumPy a column at a time or key by key
+    if key_count == 0:
+        return []
+    if has_numpy:
+        columns = unpack_key_columns(in_data, offset, key_count, curve_type)
+        rows = zip(*(column.tolist() for column in columns))
+        if curve_type == 'step':
+            return [{
+                'frame': frame,
+                'value': value,
+            } for frame, value in rows]
+        return [{
+            'frame': frame,
+            'value': value,
+            'slope': slope,
+        } for frame, value, slope in rows]
+    key_struct = key_structs[curve_type]
+    rows = key_struct.iter_unpack(in_data[offset:offset + key_count * key_struct.size])
+    if curve_type == 'step':
+        return [{
+            'frame': round(frame, 6),
+            'value': value,
+        } for frame, value in rows]
+    return [{
+        'frame': round(frame, 6),
+        'value': round(value, 6),
+        'slope': round(slope, 6),
+    } for frame, value, slope in rows]
+
+class Curve:
+    # The keys of a target as columns, far more compact than a list of dicts and cheaper to
+    # retime: NumPy arrays when it is installed, arrays of the array module otherwise. Slopes are
+    # None for step curves. Serializers write it as its list of keys, see to_val.
+    __slots__ = ['frames', 'values', 'slopes']
+
+    def __init__(self, frames, values, slopes = None):
+        self.frames = frames
+        self.values = values
+        self.slopes = slopes
+
+    def __len__(self):
+        return len(self.frames)
+
+    def columns(self):
+        if self.slopes is None:
+            return [self.frames, self.values]
+        return [self.frames, self.values, self.slopes]
+
+    def map_columns(self, frame_func, slope_func = None):
+        # The funcs take and return a whole column when it is a NumPy array, else one entry
+        if not isinstance(self.frames, array):
+            self.frames = frame_func(self.frames)
+            if self.slopes is not None and slope_func is not None:
+                self.slopes = slope_func(self.slopes)
+            return
+        self.frames = array('d', map(frame_func, self.frames))
+        if self.slopes is not None and slope_func is not None:
+            self.slopes = array('d', map(slope_func, self.slopes))
+
+    def shift(self, offset):
+        self.map_columns(lambda frames: frames + offset)
+
+    def scale(self, speed):
+        # Played speed times faster: keys come sooner and slopes, in units per frame, get steeper
+        if speed <= 0:
+            raise ValueError(f'Invalid speed {speed}.')
+        self.map_columns(lambda frames: frames / speed, lambda slopes: slopes * speed)
+
+    def clip(self, start_frame, end_frame):
+        # Keeps the keys from start_frame to end_frame, both included
+        if not isinstance(self.frames, array):
+            mask = (self.frames >= start_frame) & (self.frames <= end_frame)
+            self.frames, self.values, *slopes = [column[mask] for column in self.columns()]
+        else:
+            frames = self.frames
+            indices = [i for i, frame in enumerate(frames) if start_frame <= frame <= end_frame]
+            self.frames, self.values, *slopes = [
+                array(column.typecode, [column[i] for i in indices]) for column in self.columns()
+            ]
+        if self.slopes is not None:
+            self.slopes = slopes[0]
+
+    def rows(self):
+        return zip(*(column.tolist() for column in self.columns()))
+
+    def to_val(self):
+        # The same keys as unpack_keys gives, with floats rounded the same way after retiming
+        if self.slopes is None:
+            return [{
+                'frame': round(frame, 6),
+                'value': value,
+            } for frame, value in self.rows()]
+        return [{
+            'frame': round(frame, 6),
+            'value': round(value, 6),
+            'slope': round(slope, 6),
+        } for frame, value, slope in self.rows()]
+
+def make_curve(keys, curve_type):
+    # From a list of keys as loaded from JSON5, to retime it or pack it as columns
+    names = key_names.get(curve_type, [])
+    columns = [[key[name] for key in keys] for name in names]
+    typecodes = ['d', 'H' if curve_type == 'step' else 'd', 'd']
+    if has_numpy:
+        import numpy
+
+        columns = [numpy.array(column, typecode) for column, typecode in zip(columns, typecodes)]
+    else:
+        columns = [array(typecode, column) for column, typecode in zip(columns, typecodes)]
+    return Curve(*columns) if columns else Curve(array('d'), array('d'))
+
+def unpack_curve(in_data, offset, key_count, curve_type):
+    if key_count == 0:
+        return make_curve([], curve_type)
+    if has_numpy:
+        return Curve(*unpack_key_columns(in_data, offset, key_count, curve_type))
+    # One flat tuple for all the keys, each column is then a slice of it
+    key_format = key_structs[curve_type].format[1:]
+    fields = struct.unpack_from('>' + key_format * key_count, in_data, offset)
+    if curve_type == 'step':
+        frames = array('d', [round(frame, 6) for frame in fields[0::2]])
+        return Curve(frames, array('H', fields[1::2]))
+    return Curve(*(array('d', [round(field, 6) for field in fields[i::3]]) for i in range(3)))
+
+def unpack_target(in_data, offset, magic, columnar = False):
     target_kind = unpack_enum8(
         in_data,
         offset + 0x1,
@@ -149,18 +308,10 @@ def unpack_target(in_data, offset, magic):
 
     key_count = unpack_u16(in_data, offset + 0x4)
     keys_offset = unpack_u32(in_data, offset + 0x8)
-    keys = []
-    for i in range(key_count):
-        key_size = {
-            'step': 0x8,
-            'hermite': 0xc,
-        }[curve_type]
-        key_offset = offset + keys_offset + i * key_size
-        unpack_key = {
-            'step': unpack_step_key,
-            'hermite': unpack_hermite_key,
-        }[curve_type]
-        keys += [unpack_key(in_data, key_offset)]
+    if columnar:
+        keys = unpack_curve(in_data, offset + keys_offset, key_count, curve_type)
+    else:
+        keys = unpack_keys(in_data, offset + keys_offset, key_count, curve_type)
 
     return {
         'id': unpack_u8(in_data, offset + 0x0),
@@ -169,20 +320,20 @@ def unpack_target(in_data, offset, magic):
         'keys': keys,
     }
 
-def unpack_animation(in_data, offset):
+def unpack_animation(in_data, offset, columnar):
     magic = unpack_magic(in_data, offset + 0x0)
 
     target_count = unpack_u8(in_data, offset + 0x4)
     targets = []
     for i in range(target_count):
         target_offset = offset + unpack_u32(in_data, offset + 0x8 + i * 0x4)
-        targets += [unpack_target(in_data, target_offset, magic)]
+        targets += [unpack_target(in_data, target_offset, magic, columnar)]
     return {
         'magic': magic,
         'targets': targets,
     }
 
-def unpack_content(in_data, offset):
+def unpack_content(in_data, offset, columnar):
     kind = unpack_enum8(
         in_data,
         offset + 0x15,
@@ -195,27 +346,33 @@ def unpack_content(in_data, offset):
     animations = []
     for i in range(animation_count):
         animation_offset = offset + unpack_u32(in_data, offset + 0x18 + i * 0x4)
-        animations += [unpack_animation(in_data, animation_offset)]
+        animations += [unpack_animation(in_data, animation_offset, columnar)]
 
     return {
-        'name': in_data[offset:offset + 0x14].decode('ascii').rstrip('\0'),
+        'name': bytes(in_data[offset:offset + 0x14]).decode('ascii').rstrip('\0'),
         'kind': kind,
         'animations': animations,
     }
 
-def unpack_pai1(in_data, offset):
+def unpack_pai1(in_data, offset, lazy = False, columnar = False, **kwargs):
     tpl_count = unpack_u16(in_data, offset + 0x0c)
     tpls = []
     for i in range(tpl_count):
         tpl_offset = offset + 0x14 + unpack_u32(in_data, offset + 0x14 + i * 0x4)
-        tpls += [in_data[tpl_offset:].split(b'\0')[0].decode('ascii')]
+        tpls += [unpack_cstring(in_data, tpl_offset)]
 
     content_count = unpack_u16(in_data, offset + 0x0e)
     contents_offset = unpack_u32(in_data, offset + 0x10)
-    contents = []
-    for i in range(content_count):
-        content_offset = offset + unpack_u32(in_data, offset + contents_offset + i * 0x4)
-        contents += [unpack_content(in_data, content_offset)]
+    contents = (
+        unpack_content(
+            in_data,
+            offset + unpack_u32(in_data, offset + contents_offset + i * 0x4),
+            columnar,
+        )
+        for i in range(content_count)
+    )
+    if not lazy:
+        contents = list(contents)
 
     return {
         'magic': unpack_magic(in_data, offset + 0x00),
@@ -225,23 +382,28 @@ def unpack_pai1(in_data, offset):
         'contents': contents,
     }
 
-def unpack_sections(in_data, offset):
-    sections = []
+def iter_sections(in_data, offset, lazy, columnar):
     while offset < len(in_data):
         magic = unpack_magic(in_data, offset + 0x00)
         size = unpack_u32(in_data, offset + 0x04)
-        section = {
+        yield {
             'pat1': unpack_pat1,
             'pai1': unpack_pai1,
-        }[magic](in_data, offset)
-        sections += [section]
+        }[magic](in_data, offset, lazy = lazy, columnar = columnar)
         offset += size
+
+def unpack_sections(in_data, offset, lazy = False, columnar = False):
+    sections = iter_sections(in_data, offset, lazy, columnar)
+    if not lazy:
+        sections = list(sections)
     return sections
 
-def unpack_brlan(in_data):
+def unpack_brlan(in_data, lazy = False, columnar = False):
+    # When lazy, sections and pai1 contents are generators for streaming serializers. When
+    # columnar, the keys of each target are a Curve rather than a list of dicts.
     return {
         'version': unpack_u16(in_data, 0x06),
-        'sections': unpack_sections(in_data, 0x10),
+        'sections': unpack_sections(in_data, 0x10, lazy, columnar),
     }
 
 def pack_pat1(val):
@@ -249,9 +411,9 @@ def pack_pat1(val):
     name_data = name_data.ljust((len(name_data) + 0x3) & ~0x3, b'\0')
 
     groups_offset = 0x1c + len(name_data)
-    groups_data = b''
-    for group in val['groups']:
-        groups_data += group['name'].encode('ascii').ljust(0x14, b'\0')
+    groups_data = b''.join(
+        group['name'].encode('ascii').ljust(0x14, b'\0') for group in val['groups']
+    )
 
     return b''.join([
         pack_magic(val['magic']),
@@ -268,27 +430,21 @@ def pack_pat1(val):
         groups_data,
     ])
 
-def pack_step_key(val):
-    return b''.join([
-        pack_f32(val['frame']),
-        pack_u16(val['value']),
-        pack_pad16(None),
-    ])
-
-def pack_hermite_key(val):
-    return b''.join([
-        pack_f32(val['frame']),
-        pack_f32(val['value']),
-        pack_f32(val['slope']),
-    ])
+def pack_keys(keys, curve_type):
+    # A single struct call for all the keys, which also range checks them like pack_f32 and
+    # pack_u16 do, unlike a conversion to a NumPy array
+    if len(keys) == 0:
+        return b''
+    key_format = key_structs[curve_type].format[1:]
+    if isinstance(keys, Curve):
+        fields = [field for row in keys.rows() for field in row]
+    else:
+        names = key_names[curve_type]
+        fields = [key[name] for key in keys for name in names]
+    return struct.pack('>' + key_format * len(keys), *fields)
 
 def pack_target(val, magic):
-    keys_data = b''
-    for key in val['keys']:
-        keys_data += {
-            'step': pack_step_key,
-            'hermite': pack_hermite_key,
-        }[val['curve type']](key)
+    keys_data = pack_keys(val['keys'], val['curve type'])
 
     return b''.join([
         pack_u8(val['id']),
@@ -310,35 +466,21 @@ def pack_target(val, magic):
     ])
 
 def pack_animation(val):
-    target_offset = 0x8 + 0x4 * len(val['targets'])
-    target_offsets_data = b''
-    targets_data = b''
-    for target in val['targets']:
-        target_offsets_data += pack_u32(target_offset)
-        target_data = pack_target(target, val['magic'])
-        targets_data += target_data
-        target_offset += len(target_data)
-    targets_data = target_offsets_data + targets_data
-
-    return b''.join([
+    out_data = Buffer(0x0)
+    out_data.push(b''.join([
         pack_magic(val['magic']),
         pack_u8(len(val['targets'])),
         pack_pad24(None),
-        targets_data,
-    ])
+    ]))
+    target_offsets_offset = out_data.push(bytes(0x4 * len(val['targets'])))
+    for i, target in enumerate(val['targets']):
+        target_offset = out_data.push(pack_target(target, val['magic']))
+        out_data.patch(target_offsets_offset + i * 0x4, pack_u32(target_offset))
+    return out_data.buffer
 
 def pack_content(val):
-    animation_offset = 0x18 + 0x4 * len(val['animations'])
-    animation_offsets_data = b''
-    animations_data = b''
-    for animation in val['animations']:
-        animation_offsets_data += pack_u32(animation_offset)
-        animation_data = pack_animation(animation)
-        animations_data += animation_data
-        animation_offset += len(animation_data)
-    animations_data = animation_offsets_data + animations_data
-
-    return b''.join([
+    out_data = Buffer(0x0)
+    out_data.push(b''.join([
         val['name'].encode('ascii').ljust(0x14, b'\0'),
         pack_u8(len(val['animations'])),
         pack_enum8(
@@ -347,33 +489,16 @@ def pack_content(val):
             variants = content_kind_variants,
         ),
         pack_pad16(None),
-        animations_data,
-    ])
+    ]))
+    animation_offsets_offset = out_data.push(bytes(0x4 * len(val['animations'])))
+    for i, animation in enumerate(val['animations']):
+        animation_offset = out_data.push(pack_animation(animation))
+        out_data.patch(animation_offsets_offset + i * 0x4, pack_u32(animation_offset))
+    return out_data.buffer
 
 def pack_pai1(val):
-    tpl_offset = 0x4 * len(val['tpls'])
-    tpl_offsets_data = b''
-    tpls_data = b''
-    for tpl in val['tpls']:
-        tpl_offsets_data += pack_u32(tpl_offset)
-        tpl_data = tpl.encode('ascii') + b'\0'
-        tpls_data += tpl_data
-        tpl_offset += len(tpl_data)
-    tpls_data = tpl_offsets_data + tpls_data
-    tpls_data = tpls_data.ljust((len(tpls_data) + 0x3) & ~0x3, b'\0')
-
-    contents_offset = 0x14 + len(tpls_data)
-    content_offset = contents_offset + 0x4 * len(val['contents'])
-    content_offsets_data = b''
-    contents_data = b''
-    for content in val['contents']:
-        content_offsets_data += pack_u32(content_offset)
-        content_data = pack_content(content)
-        contents_data += content_data
-        content_offset += len(content_data)
-    contents_data = content_offsets_data + contents_data
-
-    return b''.join([
+    out_data = Buffer(0x0)
+    out_data.push(b''.join([
         pack_magic(val['magic']),
         pack_pad32(None),
         pack_u16(val['frame count']),
@@ -381,22 +506,34 @@ def pack_pai1(val):
         pack_pad8(None),
         pack_u16(len(val['tpls'])),
         pack_u16(len(val['contents'])),
-        pack_u32(contents_offset),
-        tpls_data,
-        contents_data,
-    ])
+        pack_pad32(None),
+    ]))
+
+    tpls_offset = out_data.size()
+    tpl_offsets_offset = out_data.push(bytes(0x4 * len(val['tpls'])))
+    for i, tpl in enumerate(val['tpls']):
+        tpl_offset = out_data.push(tpl.encode('ascii') + b'\0')
+        out_data.patch(tpl_offsets_offset + i * 0x4, pack_u32(tpl_offset - tpls_offset))
+    out_data.align(0x4)
+
+    contents_offset = out_data.size()
+    out_data.patch(0x10, pack_u32(contents_offset))
+    content_offsets_offset = out_data.push(bytes(0x4 * len(val['contents'])))
+    for i, content in enumerate(val['contents']):
+        content_offset = out_data.push(pack_content(content))
+        out_data.patch(content_offsets_offset + i * 0x4, pack_u32(content_offset))
+    return out_data.buffer
 
 def pack_sections(sections):
-    out_data = b''
+    out_data = Buffer(0x0)
     for section in sections:
-        section_data = {
+        section_offset = out_data.push({
             'pat1': pack_pat1,
             'pai1': pack_pai1,
-        }[section['magic']](section)
-        section_data = section_data.ljust((len(section_data) + 0x3) & ~0x3, b'\0')
-        section_data = section_data[0x0:0x4] + pack_u32(len(section_data)) + section_data[0x8:]
-        out_data += section_data
-    return out_data
+        }[section['magic']](section))
+        out_data.align(0x4)
+        out_data.patch(section_offset + 0x4, pack_u32(out_data.size() - section_offset))
+    return out_data.buffer
 
 def pack_brlan(val):
     sections_data = pack_sections(val['sections'])
@@ -410,3 +547,92 @@ def pack_brlan(val):
         pack_u16(len(val['sections'])),
         sections_data,
     ])
+
+def evaluate_numpy(curve, frames):
+    import numpy
+
+    key_frames = numpy.asarray(curve.frames, numpy.float64)
+    values = numpy.asarray(curve.values, numpy.float64)
+    if len(key_frames) == 0:
+        return numpy.full(len(frames), numpy.nan)
+    left = numpy.searchsorted(key_frames, frames, 'right') - 1
+    if curve.slopes is None or len(key_frames) == 1:
+        return values[numpy.maximum(left, 0)]
+    slopes = numpy.asarray(curve.slopes, numpy.float64)
+    i = numpy.clip(left, 0, len(key_frames) - 2)
+    # Out of range segments give inf or nan here, they are replaced by the clamped values below
+    with numpy.errstate(divide = 'ignore', invalid = 'ignore'):
+        size = key_frames[i + 1] - key_frames[i]
+        t = (frames - key_frames[i]) / size
+        t2 = t * t
+        t3 = t2 * t
+        out_values = (values[i] * (2 * t3 - 3 * t2 + 1) + values[i + 1] * (3 * t2 - 2 * t3) +
+                      slopes[i] * size * (t3 - 2 * t2 + t) + slopes[i + 1] * size * (t3 - t2))
+    out_values = numpy.where(left >= len(key_frames) - 1, values[-1], out_values)
+    return numpy.where(frames <= key_frames[0], values[0], out_values)
+
+def evaluate_python(curve, frames):
+    key_frames = curve.frames.tolist()
+    values = curve.values.tolist()
+    slopes = None if curve.slopes is None else curve.slopes.tolist()
+    out_values = []
+    for frame in frames:
+        if not key_frames:
+            out_values += [float('nan')]
+            continue
+        left = bisect_right(key_frames, frame) - 1
+        if frame <= key_frames[0]:
+            out_values += [float(values[0])]
+        elif left >= len(key_frames) - 1:
+            out_values += [float(values[-1])]
+        elif slopes is None:
+            out_values += [float(values[left])]
+        else:
+            size = key_frames[left + 1] - key_frames[left]
+            t = (frame - key_frames[left]) / size
+            t2 = t * t
+            t3 = t2 * t
+            out_values += [
+                values[left] * (2 * t3 - 3 * t2 + 1) + values[left + 1] * (3 * t2 - 2 * t3) +
+                slopes[left] * size * (t3 - 2 * t2 + t) + slopes[left + 1] * size * (t3 - t2)
+            ]
+    return out_values
+
+def evaluate_curve(curve, frames):
+    # Like the games: clamped to the first and last keys, the last key at or before the frame for
+    # step curves, hermite between the keys around it with slopes in units per frame. Targets
+    # without keys are nan.
+    if has_numpy:
+        return evaluate_numpy(curve, frames)
+    return evaluate_python(curve, frames)
+
+def sample_pai1(section, frames = None):
+    # Evaluates all the targets of a pai1 section, from unpack_brlan in either mode, at each of
+    # frames (every frame of the animation by default). Returns the frames, one (content name,
+    # animation magic, target id, target kind) per target and a frames x targets matrix: a NumPy
+    # array when it is installed, else a list of rows.
+    if frames is None:
+        frames = range(section['frame count'])
+    if has_numpy:
+        import numpy
+
+        frames = numpy.asarray(frames, numpy.float64)
+    else:
+        frames = [float(frame) for frame in frames]
+    targets = []
+    columns = []
+    for content in section['contents']:
+        for animation in content['animations']:
+            for target in animation['targets']:
+                curve = target['keys']
+                if not isinstance(curve, Curve):
+                    curve = make_curve(curve, target['curve type'])
+                targets += [(content['name'], animation['magic'], target['id'], target['kind'])]
+                columns += [evaluate_curve(curve, frames)]
+    if has_numpy:
+        if not columns:
+            return frames, targets, numpy.empty((len(frames), 0))
+        return frames, targets, numpy.stack(columns, axis = 1)
+    if not columns:
+        return frames, targets, [[] for _ in frames]
+    return frames, targets, [list(row) for row in zip(*columns)]
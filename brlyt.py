@@ -4,23 +4,23 @@ from common import *
 
 
 def unpack_string64(in_data, offset, **kwargs):
-    return in_data[offset:offset + 0x8].decode('ascii').rstrip('\0')
+    return bytes(in_data[offset:offset + 0x8]).decode('ascii').rstrip('\0')
 
 def unpack_string128(in_data, offset, **kwargs):
-    return in_data[offset:offset + 0x10].decode('ascii').rstrip('\0')
+    return bytes(in_data[offset:offset + 0x10]).decode('ascii').rstrip('\0')
 
 def unpack_string160(in_data, offset, **kwargs):
-    return in_data[offset:offset + 0x14].decode('ascii').rstrip('\0')
+    return bytes(in_data[offset:offset + 0x14]).decode('ascii').rstrip('\0')
 
 def unpack_vstring(in_data, offset, **kwargs):
     voffset = kwargs['voffset']
     offset = voffset + unpack_u32(in_data, offset)
-    return in_data[offset:].split(b'\0')[0].decode('ascii')
+    return unpack_cstring(in_data, offset)
 
 def unpack_vwstring(in_data, offset, **kwargs):
     voffset = kwargs['voffset']
     offset = voffset + unpack_u32(in_data, offset)
-    return in_data[offset:].split(b'\0\0')[0].decode('utf-16-be')
+    return unpack_cstring(in_data, offset, 'utf-16-be', b'\0\0')
 
 def unpack_pointer(in_data, offset, **kwargs):
     voffset = kwargs['voffset']
@@ -129,10 +129,9 @@ def pack_array(vals, kind, **kwargs):
     size = kwargs['size']
     pack = kwargs['pack']
     fields = kwargs['fields']
-    out_data = b''.join([
-        pack[kind](len(vals)),
-        b'\x00' * size[kind],
-    ])
+    out_data = Buffer(0x0)
+    out_data.push(pack[kind](len(vals)))
+    out_data.push(bytes(size[kind]))
     buffer_offset = len(vals) * sum(size[field.kind] for field in fields)
     buffer = Buffer(buffer_offset)
     kwargs = {
@@ -140,8 +139,9 @@ def pack_array(vals, kind, **kwargs):
         'buffer': buffer,
     }
     for val in vals:
-        out_data += pack_struct(val, **kwargs)
-    return out_data + buffer.buffer
+        out_data.push(pack_struct(val, **kwargs))
+    out_data.push(buffer.buffer)
+    return out_data.buffer
 
 def pack_array8(vals, **kwargs):
     return pack_array(vals, 'u8', **kwargs)
@@ -153,23 +153,21 @@ def pack_varray(vals, kind, has_offset, **kwargs):
     size = kwargs['size']
     pack = kwargs['pack']
     buffer = kwargs['buffer']
-    out_data = b''.join([
-        pack[kind](len(vals)),
-        b'\x00' * (4 - size[kind]),
-    ])
+    out_data = Buffer(0x0)
+    out_data.push(pack[kind](len(vals)))
+    out_data.push(bytes(4 - size[kind]))
     if has_offset:
-        out_data += pack_u32(buffer.size())
-        val_offset = 0x4 * len(vals) + buffer.size()
-        val_data = b''
+        out_data.push(pack_u32(buffer.size()))
+        val_data = Buffer(0x4 * len(vals) + buffer.size())
         for val in vals:
-            buffer.push(pack_u32(val_offset + len(val_data)))
-            val_data += pack_struct(val, **kwargs)
-        buffer.push(val_data)
+            buffer.push(pack_u32(val_data.size()))
+            val_data.push(pack_struct(val, **kwargs))
+        buffer.push(val_data.buffer)
     else:
         for val in vals:
-            out_data += pack_u32(0x4 * len(vals) + buffer.size())
+            out_data.push(pack_u32(0x4 * len(vals) + buffer.size()))
             buffer.push(pack_struct(val, **kwargs))
-    return out_data
+    return out_data.buffer
 
 def pack_varray8o(vals, **kwargs):
     return pack_varray(vals, 'u8', True, **kwargs)
@@ -182,7 +180,7 @@ def pack_vstruct(val, **kwargs):
     pack = kwargs['pack']
     fields = kwargs['fields']
     counts = 0
-    out_data = b''
+    out_data = []
     for field in fields:
         field_val = val.get(field.name)
         if field_val is None:
@@ -199,8 +197,8 @@ def pack_vstruct(val, **kwargs):
             **field.kwargs,
         }
         for array_val in vals:
-            out_data += pack[field.kind](array_val, **kwargs)
-    return pack_u32(counts) + out_data
+            out_data += [pack[field.kind](array_val, **kwargs)]
+    return b''.join([pack_u32(counts), *out_data])
 
 brlyt_size = {
     **size,
@@ -259,7 +257,7 @@ uv_set_fields = [
     Field('f32', 'bottom right v'),
 ]
 
-position_variants = [
+position_variants = Enum([
     Variant('top left', 0),
     Variant('top center', 1),
     Variant('top right', 2),
@@ -269,7 +267,7 @@ position_variants = [
     Variant('bottom left', 6),
     Variant('bottom center', 7),
     Variant('bottom right', 8),
-]
+])
 
 base_fields = [
     Field('magic', 'magic'),
@@ -471,12 +469,12 @@ txt1_fields = [
     Field('u16', 'material'),
     Field('u16', 'font'),
     Field('enum8', 'text position', variants = position_variants),
-    Field('enum8', 'text alignment', variants = [
+    Field('enum8', 'text alignment', variants = Enum([
         Variant('unspecified', 0),
         Variant('left', 1),
         Variant('center', 2),
         Variant('right', 3),
-    ]),
+    ])),
     Field('pad16', None),
     Field('vwstring', 'text'),
     Field('u8', 'top color r'),
@@ -521,14 +519,14 @@ wnd1_fields = [
     ]),
     Field('varray8o', 'frames', fields = [
         Field('u16', 'material'),
-        Field('enum8', 'transform', variants = [
+        Field('enum8', 'transform', variants = Enum([
             Variant('none', 0),
             Variant('hflip', 1),
             Variant('vflip', 2),
             Variant('rotate 90', 3),
             Variant('rotate 180', 4),
             Variant('rotate 270', 5),
-        ]),
+        ])),
         Field('pad8', None),
     ]),
 ]
@@ -566,6 +564,12 @@ section_fields = {
     'gre1': gre1_fields,
 }
 
+def compile_schemas():
+    # get_schema compiles on first use, the server calls this once before forking its jobs
+    for fields in section_fields.values():
+        get_schema(fields, brlyt_size, unpack = brlyt_unpack)
+        get_schema(fields, brlyt_size, pack = brlyt_pack)
+
 def unpack_sections(in_data, offset, parent_magic):
     sections = []
     last_section = None
@@ -631,17 +635,14 @@ def pack_section(section):
         'buffer': buffer,
     }
     section['size'] = 0x0
-    out_data = pack_struct(section, **kwargs) + buffer.buffer
-    out_data = out_data.ljust((len(out_data) + 0x3) & ~0x3, b'\x00')
-    out_data = out_data[0x0:0x4] + pack_u32(len(out_data)) + out_data[0x8:]
+    out_data = Buffer(0x0)
+    out_data.push(pack_struct(section, **kwargs))
+    out_data.push(buffer.buffer)
+    out_data.align(0x4)
+    out_data.patch(0x4, pack_u32(out_data.size()))
     # HACK: Ungroup back frame count and frame array offset
     if magic == 'wnd1':
-        out_data = b''.join([
-            out_data[:0x5c],
-            out_data[0x60:0x64],
-            out_data[0x5c:0x60],
-            out_data[0x64:],
-        ])
+        out_data.patch(0x5c, out_data.buffer[0x60:0x64] + out_data.buffer[0x5c:0x60])
     section_count = 1
     children = section.get('children')
     if children is not None:
@@ -669,18 +670,18 @@ def pack_section(section):
             },
         ]
         sections_data, sections_section_count = pack_sections(sections)
-        out_data += sections_data
+        out_data.push(sections_data)
         section_count += sections_section_count
-    return out_data, section_count
+    return out_data.buffer, section_count
 
 def pack_sections(sections):
-    out_data = b''
+    out_data = Buffer(0x0)
     section_count = 0
     for section in sections:
         section_data, section_section_count = pack_section(section)
-        out_data += section_data
+        out_data.push(section_data)
         section_count += section_section_count
-    return out_data, section_count
+    return out_data.buffer, section_count
 
 def pack_brlyt(val):
     sections_data, section_count = pack_sections(val['sections'])
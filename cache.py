@@ -0,0 +1,178 @@
+import glob
+import hashlib
+import os
+import shutil
+import tempfile
+
+
+tool_digest = None
+
+def get_tool_digest():
+    # Stands in for a version number: any change to the converters invalidates what they produced
+    global tool_digest
+    if tool_digest is None:
+        h = hashlib.sha256()
+        tool_dir = os.path.dirname(os.path.abspath(__file__))
+        for path in sorted(glob.glob(os.path.join(tool_dir, '*.py'))):
+            with open(path, 'rb') as in_file:
+                h.update(in_file.read())
+        tool_digest = h.digest()
+    return tool_digest
+
+def make_key(*parts):
+    h = hashlib.sha256(get_tool_digest())
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode('utf-8')
+        h.update(len(part).to_bytes(8, 'big'))
+        h.update(part)
+    return h.hexdigest()
+
+def file_digest(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as in_file:
+        for chunk in iter(lambda: in_file.read(0x100000), b''):
+            h.update(chunk)
+    return h.digest()
+
+def link_or_copy(src, dst):
+    # An existing file may already be a link to src, copying over it would fail
+    if os.path.lexists(dst):
+        os.unlink(dst)
+    try:
+        os.link(src, dst)
+    except OSError:
+        shutil.copy2(src, dst)
+
+def tree_size(path):
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    size = 0
+    for dir_path, _, names in os.walk(path):
+        for name in names:
+            size += os.path.getsize(os.path.join(dir_path, name))
+    return size
+
+class Cache:
+    # Objects are single files (packed members, compressed chunks), trees are decoded outputs.
+    # Both are touched when used so that eviction drops the least recently used ones first.
+    def __init__(self, path, max_size = None, link = False):
+        self.path = path
+        self.max_size = max_size
+        self.link = link
+
+    def key(self, *parts):
+        return make_key(*parts)
+
+    def entry_path(self, key):
+        return os.path.join(self.path, 'objects', key[:2], key[2:])
+
+    def tree_path(self, key):
+        return os.path.join(self.path, 'trees', key)
+
+    def get(self, key):
+        path = self.entry_path(key)
+        try:
+            with open(path, 'rb') as in_file:
+                data = in_file.read()
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key, data):
+        # Write then rename so that concurrent builds never see a partial entry
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok = True)
+        fd, tmp_path = tempfile.mkstemp(dir = os.path.dirname(path))
+        try:
+            with os.fdopen(fd, 'wb') as out_file:
+                out_file.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def get_tree(self, key, out_path):
+        path = self.tree_path(key)
+        src = os.path.join(path, 'tree')
+        if not os.path.exists(src):
+            return False
+        # Hardlinks are only used on request, editing a served file in place would alter the entry
+        copy = link_or_copy if self.link else shutil.copy2
+        # Restored over whatever is at out_path, like decoding writes over a previous output
+        if os.path.isdir(src):
+            shutil.copytree(src, out_path, copy_function = copy, dirs_exist_ok = True)
+        else:
+            copy(src, out_path)
+        os.utime(path)
+        return True
+
+    def put_tree(self, key, in_path):
+        trees_path = os.path.join(self.path, 'trees')
+        os.makedirs(trees_path, exist_ok = True)
+        tmp_path = tempfile.mkdtemp(dir = trees_path)
+        try:
+            if os.path.isdir(in_path):
+                shutil.copytree(in_path, os.path.join(tmp_path, 'tree'))
+            else:
+                shutil.copy2(in_path, os.path.join(tmp_path, 'tree'))
+            try:
+                os.rename(tmp_path, self.tree_path(key))
+            except OSError:
+                # Another process stored the same tree first
+                pass
+        finally:
+            shutil.rmtree(tmp_path, ignore_errors = True)
+
+    def evict(self):
+        if self.max_size is None:
+            return
+        entries = []
+        for dir_path, _, names in os.walk(os.path.join(self.path, 'objects')):
+            for name in names:
+                path = os.path.join(dir_path, name)
+                stat = os.stat(path)
+                entries += [(stat.st_mtime, stat.st_size, path)]
+        trees_path = os.path.join(self.path, 'trees')
+        if os.path.isdir(trees_path):
+            for name in os.listdir(trees_path):
+                path = os.path.join(trees_path, name)
+                entries += [(os.stat(path).st_mtime, tree_size(path), path)]
+        total_size = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total_size <= self.max_size:
+                break
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors = True)
+            else:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
+
+class MemoryCache:
+    # Same get/put interface as Cache for the lifetime of a process, see wuj5.py watch. Only the
+    # entries used since the last sweep are kept, so memory stays bounded by one build.
+    def __init__(self):
+        self.entries = {}
+        self.used = {}
+
+    def key(self, *parts):
+        return make_key(*parts)
+
+    def get(self, key):
+        data = self.used.get(key)
+        if data is None:
+            data = self.entries.get(key)
+            if data is not None:
+                self.used[key] = data
+        return data
+
+    def put(self, key, data):
+        self.used[key] = data
+
+    def sweep(self):
+        self.entries = self.used
+        self.used = {}
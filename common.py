@@ -36,26 +36,23 @@ def unpack_f32(in_data, offset, **kwargs):
     return round(struct.unpack_from('>f', in_data, offset)[0], 6)
 
 def unpack_magic(in_data, offset, **kwargs):
-    return in_data[offset:offset + 4].decode('ascii')
+    return bytes(in_data[offset:offset + 4]).decode('ascii')
+
+def unpack_cstring(in_data, offset, encoding = 'ascii', terminator = b'\0'):
+    # Only look at a window after offset, which is doubled until the terminator is in it
+    size = 0x40
+    while True:
+        data = bytes(in_data[offset:offset + size])
+        end = data.find(terminator)
+        if end >= 0:
+            return data[:end].decode(encoding)
+        if len(data) < size:
+            return data.decode(encoding)
+        size *= 2
 
 def unpack_struct(in_data, offset, **kwargs):
-    size = kwargs['size']
-    unpack = kwargs['unpack']
-    fields = kwargs['fields']
-    val = {}
-    field_offset = offset
-    for field in fields:
-        kwargs = {
-            **kwargs,
-            'struct_offset': offset,
-            'field': field,
-            **field.kwargs,
-        }
-        field_val = unpack[field.kind](in_data, field_offset, **kwargs)
-        if field_val is not None:
-            val[field.name] = field_val
-        field_offset += size[field.kind]
-    return val
+    schema = get_schema(kwargs['fields'], kwargs['size'], unpack = kwargs['unpack'])
+    return schema.unpack(in_data, offset, kwargs)
 
 def unpack_bitfield(in_data, offset, kind, **kwargs):
     unpack = kwargs['unpack']
@@ -79,11 +76,11 @@ def unpack_enum(in_data, offset, kind, **kwargs):
     unpack = kwargs['unpack']
     variants = kwargs['variants']
     val = unpack[kind](in_data, offset)
-    variant = next((variant for variant in variants if variant.val == val), None)
-    if variant is None:
-        vals = [variant.val for variant in variants]
+    name = variants.names.get(val)
+    if name is None:
+        vals = [variant.val for variant in variants.variants]
         sys.exit(f'Unknown enum variant with value {val} (expected one of {vals}).')
-    return variant.name
+    return name
 
 def unpack_enum8(in_data, offset, **kwargs):
     return unpack_enum(in_data, offset, 'u8', **kwargs)
@@ -131,18 +128,8 @@ def pack_magic(val, **kwargs):
     return val.encode('ascii')
 
 def pack_struct(val, **kwargs):
-    size = kwargs['size']
-    pack = kwargs['pack']
-    fields = kwargs['fields']
-    out_data = b''
-    for field in fields:
-        kwargs = {
-            **kwargs,
-            'field': field,
-            **field.kwargs,
-        }
-        out_data += pack[field.kind](val.get(field.name), **kwargs)
-    return out_data
+    schema = get_schema(kwargs['fields'], kwargs['size'], pack = kwargs['pack'])
+    return schema.pack(val, kwargs)
 
 def pack_bitfield(val, kind, **kwargs):
     unpack = kwargs['unpack']
@@ -161,11 +148,11 @@ def pack_bitfield8(val, **kwargs):
 def pack_enum(name, kind, **kwargs):
     pack = kwargs['pack']
     variants = kwargs['variants']
-    variant = next((variant for variant in variants if variant.name == name), None)
-    if variant is None:
-        names = [variant.name for variant in variants]
+    val = variants.vals.get(name)
+    if val is None:
+        names = [variant.name for variant in variants.variants]
         sys.exit(f'Unknown enum variant with name {name} (expected one of {names}).')
-    return pack[kind](variant.val)
+    return pack[kind](val)
 
 def pack_enum8(val, **kwargs):
     return pack_enum(val, 'u8', **kwargs)
@@ -240,9 +227,24 @@ class Variant:
         self.name = name
         self.val = val
 
+class Enum:
+    # Lookup tables in both directions, the first variant wins on duplicates like a linear scan
+    def __init__(self, variants):
+        self.variants = variants
+        self.names = {}
+        self.vals = {}
+        for variant in variants:
+            self.names.setdefault(variant.val, variant.name)
+            self.vals.setdefault(variant.name, variant.val)
+
+class Items:
+    # Entries of a mapping produced on demand, for values which are streamed rather than held whole
+    def __init__(self, items):
+        self.items = items
+
 class Buffer:
     def __init__(self, offset):
-        self.buffer = b''
+        self.buffer = bytearray()
         self.offset = offset
 
     def size(self):
@@ -253,11 +255,18 @@ class Buffer:
         self.buffer += data
         return size
 
+    def patch(self, offset, data):
+        offset -= self.offset
+        self.buffer[offset:offset + len(data)] = data
+
+    def align(self, alignment):
+        self.buffer += bytes(-len(self.buffer) % alignment)
+
 class Strings:
     def __init__(self, encoding, terminator):
         self.encoding = encoding
         self.terminator = terminator
-        self.buffer = terminator
+        self.buffer = bytearray(terminator)
         self.offsets = { '': 0 }
 
     def insert(self, string):
@@ -268,3 +277,110 @@ class Strings:
         self.offsets[string] = offset
         self.buffer += string.encode(self.encoding) + self.terminator
         return offset
+
+# Fields which map to a single struct format code, with their default functions and the conversions
+# applied to their values
+scalar_formats = {
+    'pad8': ('x', unpack_pad8, pack_pad8, None, None),
+    'pad16': ('2x', unpack_pad16, pack_pad16, None, None),
+    'pad24': ('3x', unpack_pad24, pack_pad24, None, None),
+    'pad32': ('4x', unpack_pad32, pack_pad32, None, None),
+    'u8': ('B', unpack_u8, pack_u8, None, None),
+    'u16': ('H', unpack_u16, pack_u16, None, None),
+    'u32': ('I', unpack_u32, pack_u32, None, None),
+    's16': ('h', unpack_s16, pack_s16, None, None),
+    'bool8': ('B', unpack_bool8, pack_bool8, lambda val: val != 0, None),
+    'bool16': ('H', unpack_bool16, pack_bool16, lambda val: val != 0, None),
+    'f32': ('f', unpack_f32, pack_f32, lambda val: round(val, 6), None),
+    'magic': ('4s', unpack_magic, pack_magic, lambda val: val.decode('ascii'),
+              lambda val: val.encode('ascii')),
+}
+
+class Schema:
+    # A field list compiled once: consecutive scalar fields are merged into a single struct.Struct,
+    # other fields are dispatched with their own kwargs prepared in advance.
+    def __init__(self, fields, size, unpack, pack):
+        funcs = unpack if unpack is not None else pack
+        self.size = sum(size[field.kind] for field in fields)
+        # Each step is either (offset, struct, names, unpack conversions, pack conversions) for
+        # scalars or (offset, None, name, function, kwargs) for any other field
+        self.steps = []
+        run = None
+        field_offset = 0
+        for field in fields:
+            scalar_format = scalar_formats.get(field.kind)
+            if scalar_format is not None and funcs[field.kind] in scalar_format[1:3]:
+                code, _, _, unpack_convert, pack_convert = scalar_format
+                if run is None:
+                    run = [field_offset, '>', [], [], []]
+                    self.steps += [run]
+                run[1] += code
+                if not field.kind.startswith('pad'):
+                    index = len(run[2])
+                    run[2] += [field.name]
+                    if unpack_convert is not None:
+                        run[3] += [(index, field.name, unpack_convert)]
+                    if pack_convert is not None:
+                        run[4] += [(index, pack_convert)]
+            else:
+                run = None
+                field_kwargs = {
+                    'field': field,
+                    **field.kwargs,
+                }
+                self.steps += [(field_offset, None, field.name, funcs[field.kind], field_kwargs)]
+            field_offset += size[field.kind]
+        self.steps = [
+            (step[0], struct.Struct(step[1]), *step[2:]) if isinstance(step, list) else step
+            for step in self.steps
+        ]
+
+    def unpack(self, in_data, offset, kwargs):
+        val = {}
+        for step in self.steps:
+            if step[1] is not None:
+                field_offset, scalars, names, converts, _ = step
+                vals = scalars.unpack_from(in_data, offset + field_offset)
+                val.update(zip(names, vals))
+                for index, name, convert in converts:
+                    val[name] = convert(vals[index])
+            else:
+                field_offset, _, name, func, field_kwargs = step
+                field_kwargs = {
+                    **kwargs,
+                    'struct_offset': offset,
+                    **field_kwargs,
+                }
+                field_val = func(in_data, offset + field_offset, **field_kwargs)
+                if field_val is not None:
+                    val[name] = field_val
+        return val
+
+    def pack(self, val, kwargs):
+        out_data = []
+        for step in self.steps:
+            if step[1] is not None:
+                _, scalars, names, _, converts = step
+                vals = [val.get(name) for name in names]
+                for index, convert in converts:
+                    vals[index] = convert(vals[index])
+                out_data += [scalars.pack(*vals)]
+            else:
+                _, _, name, func, field_kwargs = step
+                field_kwargs = {
+                    **kwargs,
+                    **field_kwargs,
+                }
+                out_data += [func(val.get(name), **field_kwargs)]
+        return b''.join(out_data)
+
+schemas = {}
+
+def get_schema(fields, size, unpack = None, pack = None):
+    key = id(fields), id(size), id(unpack), id(pack)
+    entry = schemas.get(key)
+    if entry is None:
+        # Keep what the key was made from alive alongside the schema so that no id can be reused
+        entry = fields, size, unpack, pack, Schema(fields, size, unpack, pack)
+        schemas[key] = entry
+    return entry[-1]
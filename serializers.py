@@ -0,0 +1,154 @@
+import importlib
+from importlib.util import find_spec
+import math
+from types import GeneratorType
+
+
+# Backends are only imported once used, the CLI lists them without paying for all of them
+has_orjson = find_spec('orjson') is not None
+
+def to_val(val):
+    # Values kept compact in memory, like brlan.Curve, are written as the plain value they stand for
+    if hasattr(val, 'to_val'):
+        return val.to_val()
+    raise TypeError(f'Unsupported value of type {type(val).__name__}.')
+
+def dumps_json5(val, ensure_ascii):
+    import json5
+
+    return json5.dumps(val, ensure_ascii = ensure_ascii, indent = 4, quote_keys = True,
+                       default = to_val)
+
+def loads_json5(in_data):
+    import json5
+
+    return json5.loads(in_data)
+
+def is_lazy(val):
+    from common import Items
+
+    if isinstance(val, (Items, GeneratorType)):
+        return True
+    if isinstance(val, dict):
+        return any(isinstance(entry, (Items, GeneratorType)) for entry in val.values())
+    return False
+
+def dump_json5(val, out_file, ensure_ascii, level = 0):
+    # Writes the same layout as dumps_json5 without holding the whole text: lazy containers are
+    # written entry by entry, anything else is dumped whole and indented to its level.
+    indent = '    ' * level
+    if not is_lazy(val):
+        out_file.write(dumps_json5(val, ensure_ascii).replace('\n', '\n' + indent))
+        return
+    if isinstance(val, GeneratorType):
+        brackets = '[]'
+        entries = ((None, entry) for entry in val)
+    else:
+        brackets = '{}'
+        entries = val.items() if isinstance(val, dict) else val.items
+    is_empty = True
+    for key, entry in entries:
+        if is_empty:
+            out_file.write(brackets[0] + '\n')
+            is_empty = False
+        if is_lazy(entry):
+            out_file.write(indent + '    ')
+            if key is not None:
+                out_file.write(dumps_json5(str(key), ensure_ascii) + ': ')
+            dump_json5(entry, out_file, ensure_ascii, level + 1)
+            out_file.write(',\n')
+        else:
+            # A one-entry container dumps as its brackets around the indented entry line
+            container = [entry] if key is None else {key: entry}
+            out_data = dumps_json5(container, ensure_ascii)[2:-2]
+            out_file.write(indent + out_data.replace('\n', '\n' + indent) + '\n')
+    if is_empty:
+        out_file.write(brackets)
+    else:
+        out_file.write(indent + brackets[1])
+
+def dumps_json(val, ensure_ascii, indent = 4):
+    import json
+
+    return json.dumps(val, ensure_ascii = ensure_ascii, indent = indent, default = to_val)
+
+def has_non_finite(val):
+    if isinstance(val, float):
+        return not math.isfinite(val)
+    if isinstance(val, dict):
+        return any(has_non_finite(entry) for entry in val.values())
+    if isinstance(val, (list, tuple)):
+        return any(has_non_finite(entry) for entry in val)
+    if hasattr(val, 'to_val'):
+        return has_non_finite(val.to_val())
+    return False
+
+def dumps_orjson(val, ensure_ascii):
+    import orjson
+
+    # orjson can only indent by 2 and always emits UTF-8
+    option = orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+    out_data = orjson.dumps(val, default = to_val, option = option)
+    # orjson writes NaN and infinities as null, which would not encode back to the same file. Only
+    # look for them when there is a null at all, and leave such values to the json module, laid
+    # out like orjson does.
+    if b'null' in out_data and has_non_finite(val):
+        return dumps_json(val, False, indent = 2)
+    return out_data.decode('utf-8')
+
+def loads_json(in_data):
+    # Whichever backend wrote it, strict JSON is read with the fastest parser available
+    if has_orjson:
+        import orjson
+
+        try:
+            return orjson.loads(in_data)
+        except orjson.JSONDecodeError:
+            # Most likely the NaN or Infinity that the json module writes
+            pass
+    import json
+
+    return json.loads(in_data)
+
+def dumps_binval(val, ensure_ascii):
+    from binval import dumps_bin
+
+    return dumps_bin(val, to_val)
+
+def loads_binval(in_data):
+    from binval import loads_bin
+
+    return loads_bin(in_data)
+
+class Serializer:
+    # dump writes to a file and may be given lazy values, see unpack_brlan and unpack_bmg.
+    # Binary serializers dump to and load from bytes, the others to and from str. modules are
+    # the backends which dumps and loads import when first called.
+    def __init__(self, ext, dumps, loads, dump = None, binary = False, modules = []):
+        self.ext = ext
+        self.dumps = dumps
+        self.loads = loads
+        self.dump = dump
+        self.binary = binary
+        self.modules = modules
+
+    def import_modules(self):
+        for name in self.modules:
+            importlib.import_module(name)
+
+serializers = {
+    'json5': Serializer('json5', dumps_json5, loads_json5, dump_json5, modules = ['json5']),
+    'json': Serializer('json', dumps_json, loads_json, modules = ['json']),
+}
+# Always listed so that asking for it without orjson installed says so, see main in wuj5.py
+serializers['orjson'] = Serializer('json', dumps_orjson, loads_json,
+                                   modules = ['orjson'] if has_orjson else [])
+serializers['bin'] = Serializer('bin', dumps_binval, loads_binval, binary = True,
+                                modules = ['binval'])
+
+# Used on encode, where the format is given by the extension of the text file
+ext_serializers = {
+    'json5': serializers['json5'],
+    'json': serializers['json'],
+    'bin': serializers['bin'],
+}
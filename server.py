@@ -0,0 +1,160 @@
+# Kept free of the converters so that the client stays cheap to start.
+#
+# A fork server: each request runs in a process forked from the server, which saves the imports
+# and schema compilation done before serving (see warm_up in wuj5.py) but keeps no state between
+# requests, whatever a job caches is gone once it exits.
+#
+# The client hands its stdin, stdout and stderr to the server, so both ends only talk to a peer
+# of the same user, and the default socket lives in a directory only that user can access.
+
+import json
+import os
+import signal
+import socket
+import stat
+import struct
+import sys
+import tempfile
+import traceback
+
+
+def private_dir():
+    path = os.environ.get('XDG_RUNTIME_DIR')
+    if path is not None:
+        return path
+    path = os.path.join(tempfile.gettempdir(), f'wuj5-{os.getuid()}')
+    try:
+        os.mkdir(path, 0o700)
+    except FileExistsError:
+        pass
+    # Someone else may have created it first, or made it a symlink
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        sys.exit(f'{path} is not a directory private to the current user.')
+    return path
+
+def default_socket_path():
+    path = os.environ.get('WUJ5_SOCKET')
+    if path is None:
+        path = os.path.join(private_dir(), 'wuj5.sock')
+    return path
+
+def is_own_socket(path):
+    info = os.lstat(path)
+    return stat.S_ISSOCK(info.st_mode) and info.st_uid == os.getuid()
+
+def peer_uid(conn):
+    # Only available on Linux, elsewhere the ownership checks of the socket file have to do
+    if not hasattr(socket, 'SO_PEERCRED'):
+        return os.getuid()
+    creds = conn.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize('3i'))
+    return struct.unpack('3i', creds)[1]
+
+def recv_exact(conn, size):
+    data = b''
+    while len(data) < size:
+        chunk = conn.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError('Connection closed early.')
+        data += chunk
+    return data
+
+def run_request(conn, main):
+    # The client sends its stdin, stdout and stderr with the header so that the job writes
+    # straight to them, just like a CLI invocation would
+    header, fds, _, _ = socket.recv_fds(conn, 0x4, 0x3)
+    header += recv_exact(conn, 0x4 - len(header))
+    request = json.loads(recv_exact(conn, struct.unpack('>I', header)[0]))
+    for fd, std_fd in zip(fds, [0, 1, 2]):
+        os.dup2(fd, std_fd)
+        os.close(fd)
+    os.chdir(request['cwd'])
+    sys.argv = [request['prog'], *request['args']]
+    try:
+        main()
+        code = 0
+    except SystemExit as e:
+        # Same handling as the interpreter gives an uncaught SystemExit
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file = sys.stderr)
+            code = 1
+    except BaseException:
+        traceback.print_exc()
+        code = 1
+    sys.stdout.flush()
+    sys.stderr.flush()
+    conn.sendall(struct.pack('>i', code))
+
+def serve(path, main):
+    if os.path.lexists(path):
+        # Most likely left by a server which did not exit cleanly, but only ever remove our own
+        if not is_own_socket(path):
+            sys.exit(f'{path} already exists and is not a socket of the current user.')
+        os.unlink(path)
+    listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    old_umask = os.umask(0o177)
+    try:
+        listener.bind(path)
+    finally:
+        os.umask(old_umask)
+    listener.listen()
+    # Jobs are run in forked processes, which start with everything already imported and compiled
+    signal.signal(signal.SIGCHLD, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit())
+    print(f'Serving on {path}.', file = sys.stderr)
+    try:
+        while True:
+            conn, _ = listener.accept()
+            if peer_uid(conn) != os.getuid():
+                conn.close()
+                continue
+            if os.fork() != 0:
+                conn.close()
+                continue
+            signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            listener.close()
+            code = 1
+            try:
+                run_request(conn, main)
+                code = 0
+            finally:
+                os._exit(code)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        listener.close()
+        if os.path.lexists(path) and is_own_socket(path):
+            os.unlink(path)
+
+def request(path, prog, args):
+    try:
+        is_owned = os.stat(path).st_uid == os.getuid()
+    except OSError as e:
+        sys.exit(f'Cannot connect to the server on {path}: {e.strerror}.')
+    if not is_owned:
+        sys.exit(f'{path} is not owned by the current user.')
+    conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        conn.connect(path)
+    except OSError as e:
+        sys.exit(f'Cannot connect to the server on {path}: {e.strerror}.')
+    with conn:
+        # The socket may have been replaced since it was checked
+        if peer_uid(conn) != os.getuid():
+            sys.exit(f'The server on {path} is run by another user.')
+        request = json.dumps({
+            'prog': prog,
+            'args': args,
+            'cwd': os.getcwd(),
+        }).encode('utf-8')
+        socket.send_fds(conn, [struct.pack('>I', len(request))], [0, 1, 2])
+        conn.sendall(request)
+        try:
+            return struct.unpack('>i', recv_exact(conn, 0x4))[0]
+        except ConnectionError:
+            sys.exit('The server closed the connection without an exit code.')
@@ -0,0 +1,125 @@
+# Per-stage timing for --profile. While enabled, each stage records how long it took, the file or
+# archive member it worked on and how many bytes it was given and produced. Values have no size
+# of their own, so a stage which parses or builds one counts the bytes on its other side for it.
+
+import json
+import sys
+import time
+
+
+records = None
+profiler = None
+is_tracing_memory = False
+
+class Stage:
+    # with stage('compress', path, len(in_data)) as s: ... s.out_size = len(out_data)
+    def __init__(self, name, member, in_size):
+        self.name = name
+        self.member = member
+        self.in_size = in_size
+        self.out_size = None
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if records is None:
+            return
+        records.append({
+            'stage': self.name,
+            'member': self.member,
+            'seconds': time.perf_counter() - self.start,
+            'bytes in': self.in_size,
+            'bytes out': self.out_size,
+        })
+
+def stage(name, member, in_size = None):
+    return Stage(name, member, in_size)
+
+def is_enabled():
+    return records is not None
+
+def enable():
+    global records
+    records = []
+
+def collect():
+    # Takes the records so far, for worker processes to send them back with their result
+    global records
+    collected = records
+    if records is not None:
+        records = []
+    return collected
+
+def merge(collected):
+    if records is not None and collected is not None:
+        records.extend(collected)
+
+def call(enabled, func, *args):
+    # Runs func in a worker process, which does not share the records of its parent
+    if enabled:
+        enable()
+    return func(*args), collect()
+
+def start(cprofile_path, tracemalloc_path):
+    global profiler, is_tracing_memory
+    enable()
+    # Only the main process is seen by these, not the workers
+    if cprofile_path is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+        profiler.enable()
+    if tracemalloc_path is not None:
+        import tracemalloc
+
+        tracemalloc.start()
+        is_tracing_memory = True
+
+def write_report(out_file):
+    # Totals per stage, in the order they first ran
+    totals = {}
+    for record in records:
+        total = totals.setdefault(record['stage'], [0, 0.0, 0, 0])
+        total[0] += 1
+        total[1] += record['seconds']
+        total[2] += record['bytes in'] or 0
+        total[3] += record['bytes out'] or 0
+    print(f'{"stage":12} {"count":>6} {"seconds":>10} {"bytes in":>12} {"bytes out":>12} '
+          f'{"MB/s":>8}', file = out_file)
+    for name, (count, seconds, in_size, out_size) in totals.items():
+        speed = max(in_size, out_size) / seconds / 1e6 if seconds > 0 else 0.0
+        print(f'{name:12} {count:6} {seconds:10.3f} {in_size:12} {out_size:12} {speed:8.2f}',
+              file = out_file)
+
+def write_trace(out_path):
+    members = {}
+    for record in records:
+        members.setdefault(record['member'], []).append({
+            'stage': record['stage'],
+            'seconds': record['seconds'],
+            'bytes in': record['bytes in'],
+            'bytes out': record['bytes out'],
+        })
+    with open(out_path, 'w', encoding = 'utf-8') as out_file:
+        json.dump(members, out_file, indent = 4)
+
+def stop(is_reporting, trace_path, cprofile_path, tracemalloc_path):
+    global profiler, is_tracing_memory
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(cprofile_path)
+        profiler = None
+    if is_tracing_memory:
+        import tracemalloc
+
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.take_snapshot().dump(tracemalloc_path)
+        tracemalloc.stop()
+        is_tracing_memory = False
+        print(f'peak traced memory: {peak} bytes', file = sys.stderr)
+    if is_reporting:
+        write_report(sys.stderr)
+    if trace_path is not None:
+        write_trace(trace_path)
@@ -1,3 +1,5 @@
+import io
+
 from common import *
 
 
@@ -23,7 +25,7 @@ def unpack_dir(in_data, nodes_offset, names_offset, index):
 def unpack_node(in_data, nodes_offset, names_offset, index):
     is_dir = unpack_bool8(in_data, nodes_offset + index * 0xc + 0x0)
     name_offset = names_offset + unpack_u32(in_data, nodes_offset + index * 0xc + 0x0) & 0xffffff
-    name = in_data[name_offset:].split(b'\0', 1)[0].decode('ascii')
+    name = unpack_cstring(in_data, name_offset)
     if is_dir:
         node, index = unpack_dir(in_data, nodes_offset, names_offset, index)
     else:
@@ -52,33 +54,30 @@ def process_node(node, index, names, contents):
         node['count'] = count
         return count
     else:
-        node['content_offset'] = contents.size()
-        contents.push(node['content'])
-        contents.buffer = contents.buffer.ljust((len(contents.buffer) + 0x1f) & ~0x1f, b'\0')
+        node['content_offset'] = contents.push(node['content'])
+        contents.align(0x20)
         return 1
 
-def pack_node(node, contents_offset, parent_index):
+def pack_node(node, contents_offset, parent_index, nodes):
     common_data = b''.join([
         pack_bool8(node['is_dir']),
         pack_u32(node['name_offset'])[1:4],
     ])
 
     if node['is_dir']:
-        children_data = b''
-        for child in node['children']:
-            children_data += pack_node(child, contents_offset, node['index'])
-        return b''.join([
+        nodes.push(b''.join([
             common_data,
             pack_u32(parent_index),
             pack_u32(node['index'] + node['count']),
-            children_data,
-        ])
+        ]))
+        for child in node['children']:
+            pack_node(child, contents_offset, node['index'], nodes)
     else:
-        return b''.join([
+        nodes.push(b''.join([
             common_data,
             pack_u32(contents_offset + node['content_offset']),
             pack_u32(len(node['content'])),
-        ])
+        ]))
 
 def pack_u8(root):
     root['name'] = '.'
@@ -95,7 +94,8 @@ def pack_u8(root):
     contents_offset = names_offset + len(names.buffer)
     contents_offset = (contents_offset + 0x1f) & ~0x1f
     names.buffer = names.buffer.ljust(contents_offset - names_offset, b'\0')
-    nodes_data = pack_node(root, contents_offset, 0x0)
+    nodes = Buffer(0x20)
+    pack_node(root, contents_offset, 0x0, nodes)
 
     return b''.join([
         b'U\xaa8-',
@@ -106,7 +106,63 @@ def pack_u8(root):
         pack_pad32(None),
         pack_pad32(None),
         pack_pad32(None),
-        nodes_data,
+        nodes.buffer,
         names.buffer,
         contents.buffer,
     ])
+
+class U8Archive:
+    # Only indexes the node and name tables, member contents are sliced on demand
+    def __init__(self, in_data):
+        self.view = memoryview(in_data)
+        nodes_offset = unpack_u32(in_data, 0x4)
+        count = unpack_u32(in_data, nodes_offset + 0x8)
+        names_offset = nodes_offset + count * 0xc
+        names = bytes(self.view[names_offset:nodes_offset + unpack_u32(in_data, 0x8)])
+        self.files = {}
+        self.dirs = {}
+        # Directories being walked, as (path, index of the node following their last child)
+        parents = []
+        nodes = struct.iter_unpack('>III', self.view[nodes_offset:names_offset])
+        for index, (kind_name_offset, content_offset, content_size) in enumerate(nodes):
+            while parents and index >= parents[-1][1]:
+                parents.pop()
+            name_offset = kind_name_offset & 0xffffff
+            name = names[name_offset:names.index(b'\0', name_offset)].decode('ascii')
+            # Like unpack_u8, paths are relative to the first child of the root node
+            if len(parents) == 0:
+                path = None
+            elif parents[-1][0] is None:
+                if len(self.dirs) > 0:
+                    break
+                path = ''
+            elif parents[-1][0] == '':
+                path = name
+            else:
+                path = parents[-1][0] + '/' + name
+            if path is not None:
+                if path != '':
+                    self.dirs[parents[-1][0]] += [name]
+                if kind_name_offset >> 24 != 0:
+                    self.dirs[path] = []
+                else:
+                    self.files[path] = content_offset, content_size
+            if kind_name_offset >> 24 != 0:
+                parents += [(path, content_size)]
+
+    def isdir(self, path):
+        return path in self.dirs
+
+    def listdir(self, path = ''):
+        return self.dirs[path]
+
+    def read(self, path):
+        content_offset, content_size = self.files[path]
+        return self.view[content_offset:content_offset + content_size]
+
+    def open(self, path):
+        return io.BytesIO(self.read(path))
+
+    def close(self):
+        # Members already read keep their views, the data can only be freed once they are gone
+        self.view.release()
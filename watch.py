@@ -0,0 +1,92 @@
+import ctypes
+import ctypes.util
+import os
+import select
+import struct
+import sys
+import time
+
+
+# Modifications, attribute changes, creations, deletions and renames of entries or of the
+# watched directory itself
+inotify_mask = 0x2 | 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+# Directories created or moved in, which need watches of their own
+inotify_new_dir_mask = 0x80 | 0x100
+inotify_is_dir = 0x40000000
+# In seconds, inputs are still checked that often with inotify in case an event was missed
+inotify_interval = 5.0
+
+def signature(path):
+    # What a rebuild depends on: the listing of the tree and the size and mtime of each file
+    try:
+        if not os.path.isdir(path):
+            stat = os.stat(path)
+            return stat.st_mtime_ns, stat.st_size
+        entries = []
+        for dir_path, dir_names, names in os.walk(path):
+            dir_names.sort()
+            for name in sorted(names):
+                file_path = os.path.join(dir_path, name)
+                stat = os.stat(file_path)
+                entries += [(file_path, stat.st_mtime_ns, stat.st_size)]
+        return tuple(entries)
+    except FileNotFoundError:
+        return None
+
+def watched_dirs(paths):
+    # Files are watched through their directory since editors often replace them by renaming
+    dirs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dir_path, _, _ in os.walk(path):
+                dirs += [dir_path]
+        else:
+            dirs += [os.path.dirname(os.path.abspath(path))]
+    return dirs
+
+class Watcher:
+    # Wakes up on inotify events, or every interval when inotify is not available
+    def __init__(self, paths, interval, poll = False):
+        self.paths = paths
+        self.interval = interval
+        self.fd = None
+        if poll or not sys.platform.startswith('linux'):
+            return
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno = True)
+        fd = getattr(libc, 'inotify_init1', lambda flags: -1)(os.O_NONBLOCK | os.O_CLOEXEC)
+        if fd < 0:
+            return
+        self.libc = libc
+        self.fd = fd
+
+    def add_watches(self):
+        # Adding a watch again only updates it, this picks up directories created since
+        for dir_path in watched_dirs(self.paths):
+            self.libc.inotify_add_watch(self.fd, os.fsencode(dir_path), inotify_mask)
+
+    def drain(self):
+        if self.fd is None:
+            return
+        has_new_dirs = False
+        try:
+            while True:
+                events = os.read(self.fd, 0x10000)
+                offset = 0
+                while offset < len(events):
+                    _, mask, _, name_size = struct.unpack_from('iIII', events, offset)
+                    if mask & inotify_is_dir and mask & inotify_new_dir_mask:
+                        has_new_dirs = True
+                    offset += 0x10 + name_size
+        except BlockingIOError:
+            pass
+        # Watched right away, so that what is saved in them before the next wait is seen
+        if has_new_dirs:
+            self.add_watches()
+
+    def wait(self):
+        if self.fd is None:
+            time.sleep(self.interval)
+            return
+        self.add_watches()
+        # Whatever happens in a directory before its watch is in place is caught by the timeout
+        select.select([self.fd], [], [], inotify_interval)
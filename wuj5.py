@@ -2,26 +2,45 @@
 
 
 from argparse import ArgumentParser
-import json5
-import lzma
+import importlib
+import mmap
 import os
 import struct
 import sys
+import time
 
-from bmg import unpack_bmg, pack_bmg
-from brctr import unpack_brctr, pack_brctr
-from brlan import unpack_brlan, pack_brlan
-from brlyt import unpack_brlyt, pack_brlyt
-from u8 import unpack_u8, pack_u8
-from yaz import unpack_yaz, pack_yaz
+# Format modules, archives, compression and multiprocessing are only imported when a conversion
+# needs them, so that one-shot conversions don't pay for all of them at startup
+from serializers import has_orjson, serializers, ext_serializers
+import timing
 
 
-ext_unpack = {
-    'bmg': unpack_bmg,
-    'brctr': unpack_brctr,
-    'brlan': unpack_brlan,
-    'brlyt': unpack_brlyt,
-}
+class LazyTable:
+    # Maps extensions to functions of modules which are imported on first use
+    def __init__(self, entries):
+        self.entries = entries
+
+    def __contains__(self, ext):
+        return ext in self.entries
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __getitem__(self, ext):
+        module_name, name = self.entries[ext]
+        return getattr(importlib.import_module(module_name), name)
+
+    def get(self, ext, default = None):
+        if ext not in self.entries:
+            return default
+        return self[ext]
+
+ext_unpack = LazyTable({
+    'bmg': ('bmg', 'unpack_bmg'),
+    'brctr': ('brctr', 'unpack_brctr'),
+    'brlan': ('brlan', 'unpack_brlan'),
+    'brlyt': ('brlyt', 'unpack_brlyt'),
+})
 
 ext_magic = {
     'bmg': b'MESG',
@@ -30,85 +49,279 @@ ext_magic = {
     'brlyt': b'RLYT',
 }
 
-ext_pack = {
-    'bmg': pack_bmg,
-    'brctr': pack_brctr,
-    'brlan': pack_brlan,
-    'brlyt': pack_brlyt,
-}
+ext_pack = LazyTable({
+    'bmg': ('bmg', 'pack_bmg'),
+    'brctr': ('brctr', 'pack_brctr'),
+    'brlan': ('brlan', 'pack_brlan'),
+    'brlyt': ('brlyt', 'pack_brlyt'),
+})
 
-def decode_u8_node(out_path, node, retained, renamed):
-    name = node['name']
-    if name in renamed:
-        name = renamed[name]
-    out_path = os.path.join(out_path, name)
-    if node['is_dir']:
-        os.mkdir(out_path)
-        for child in node['children']:
-            decode_u8_node(out_path, child, retained, renamed)
+# Unpackers which can produce their sections on demand (lazy = True), for serializers which stream
+lazy_unpack_exts = {'bmg', 'brlan'}
+
+def map_file(in_file):
+    # Map the file rather than reading it so that decoding does not double resident memory
+    if os.fstat(in_file.fileno()).st_size == 0:
+        return b''
+    return mmap.mmap(in_file.fileno(), 0, access = mmap.ACCESS_READ)
+
+def close_map(in_data):
+    if not isinstance(in_data, mmap.mmap):
+        return
+    try:
+        in_data.close()
+    except BufferError:
+        # The traceback of an error can still hold views of it, it is then closed once collected
+        pass
+
+def write_val(out_path, ext, in_data, serializer, ensure_ascii):
+    if serializer.dump is None:
+        with timing.stage('unpack', out_path, len(in_data)) as stage:
+            val = ext_unpack[ext](in_data)
+            stage.out_size = len(in_data)
+        with timing.stage('serialize', out_path) as stage:
+            out_data = serializer.dumps(val, ensure_ascii)
+            stage.in_size = stage.out_size = len(out_data)
+        with timing.stage('write', out_path, len(out_data)) as stage:
+            if serializer.binary:
+                with open(out_path, 'wb') as out_file:
+                    out_file.write(out_data)
+                    stage.out_size = out_file.tell()
+            else:
+                with open(out_path, 'w', encoding = 'utf-8') as out_file:
+                    out_file.write(out_data)
+                    stage.out_size = out_file.tell()
+        return
+    # Lazy sections are unpacked as they are written, so most of it is timed as serialize
+    with timing.stage('unpack', out_path, len(in_data)) as stage:
+        if ext in lazy_unpack_exts:
+            val = ext_unpack[ext](in_data, lazy = True)
+        else:
+            val = ext_unpack[ext](in_data)
+        stage.out_size = len(in_data)
+    with timing.stage('serialize', out_path) as stage:
+        with open(out_path, 'w', encoding = 'utf-8') as out_file:
+            try:
+                serializer.dump(val, out_file, ensure_ascii)
+                stage.in_size = stage.out_size = out_file.tell()
+            except BaseException:
+                # Lazy values can still fail halfway, don't leave a truncated file behind
+                out_file.close()
+                os.remove(out_path)
+                raise
+
+def map_bounded(executor, workers, calls):
+    # Like executor.map over (key, func, *args) calls, yielding (key, result) in order, but only
+    # submitting a couple of calls per worker ahead so that their arguments are not all held at once
+    from collections import deque
+
+    is_timed = timing.is_enabled()
+    pending = deque()
+    for key, func, *args in calls:
+        pending.append((key, executor.submit(timing.call, is_timed, func, *args)))
+        if len(pending) >= 2 * workers:
+            key, future = pending.popleft()
+            yield key, future.result()
+    while pending:
+        key, future = pending.popleft()
+        yield key, future.result()
+
+def is_convertible(out_path, in_data):
+    ext = out_path.split(os.extsep)[-1]
+    return ext in ext_unpack and in_data[0:4] == ext_magic[ext]
+
+def decode_u8_member(out_path, in_data, text_format):
+    ext = out_path.split(os.extsep)[-1]
+    if not is_convertible(out_path, in_data):
+        out_data = in_data
+        with timing.stage('write', out_path, len(out_data)) as stage:
+            with open(out_path, 'wb') as out_file:
+                out_file.write(out_data)
+                stage.out_size = out_file.tell()
+    else:
+        serializer = serializers[text_format]
+        write_val(out_path + os.extsep + serializer.ext, ext, in_data, serializer, True)
+
+def decode_u8_node(out_path, archive, path, retained, renamed, members):
+    if archive.isdir(path):
+        os.makedirs(out_path, exist_ok = True)
+        for name in archive.listdir(path):
+            child_path = path + '/' + name if path else name
+            if name in renamed:
+                name = renamed[name]
+            decode_u8_node(os.path.join(out_path, name), archive, child_path, retained, renamed,
+                           members)
     else:
         if retained is not None and out_path not in retained:
             return
-        ext = out_path.split(os.extsep)[-1]
-        in_data = node['content']
-        unpack = ext_unpack.get(ext)
-        if unpack is None or in_data[0:4] != ext_magic[ext]:
-            out_data = in_data
-            with open(out_path, 'wb') as out_file:
-                out_file.write(out_data)
-        else:
-            val = unpack(in_data)
-            out_data = json5.dumps(val, indent = 4, quote_keys = True)
-            with open(out_path + '.json5', 'w', encoding = 'utf-8') as out_file:
-                out_file.write(out_data)
+        members += [(out_path, path)]
+
+def decode_u8(in_path, out_path, retained, renamed, text_format, u8_workers):
+    import lzma
+    from u8 import U8Archive
+    from yaz import YazReader
 
-def decode_u8(in_path, out_path, retained, renamed):
     with open(in_path, 'rb') as in_file:
-        in_data = in_file.read()
-    magic = in_data[0:4]
-    ext = in_path.split(os.extsep)[-1]
-    if ext != 'lzma':
-        expected_magic = {
-            'arc': b'U\xaa8-',
-            'szs': b'Yaz0',
-        }[ext]
-        if magic != expected_magic:
-            magic = magic.decode('ascii')
-            expected_magic = expected_magic.decode('ascii')
-            sys.exit(f'Unexpected magic {magic} for extension {ext} (expected {expected_magic}).')
-    if ext == 'szs':
-        in_data = unpack_yaz(in_data)
-    elif ext == 'lzma':
-        in_data = lzma.decompress(in_data)
-    root = unpack_u8(in_data)
+        magic = in_file.read(4)
+        ext = in_path.split(os.extsep)[-1]
+        if ext != 'lzma':
+            expected_magic = {
+                'arc': b'U\xaa8-',
+                'szs': b'Yaz0',
+            }[ext]
+            if magic != expected_magic:
+                magic = magic.decode('ascii')
+                expected_magic = expected_magic.decode('ascii')
+                sys.exit(f'Unexpected magic {magic} for extension {ext} '
+                         f'(expected {expected_magic}).')
+        in_file.seek(0)
+        if ext == 'szs':
+            # Decompress straight from the file rather than holding both versions in memory, so
+            # reading is timed as part of decompress
+            with timing.stage('decompress', in_path, os.fstat(in_file.fileno()).st_size) as stage:
+                reader = YazReader(in_file)
+                in_data = bytearray(reader.size)
+                reader.readinto(in_data)
+                stage.out_size = len(in_data)
+        elif ext == 'lzma':
+            with timing.stage('read', in_path, os.fstat(in_file.fileno()).st_size) as stage:
+                in_data = in_file.read()
+                stage.out_size = len(in_data)
+            with timing.stage('decompress', in_path, len(in_data)) as stage:
+                in_data = lzma.decompress(in_data)
+                stage.out_size = len(in_data)
+        else:
+            with timing.stage('read', in_path, os.fstat(in_file.fileno()).st_size) as stage:
+                in_data = map_file(in_file)
+                stage.out_size = len(in_data)
+    try:
+        with timing.stage('u8 parse', in_path, len(in_data)) as stage:
+            archive = U8Archive(in_data)
+            stage.out_size = len(in_data)
+        try:
+            decode_u8_members(in_path, out_path, archive, retained, renamed, text_format,
+                              u8_workers)
+        finally:
+            archive.close()
+    finally:
+        close_map(in_data)
+
+def decode_u8_members(in_path, out_path, archive, retained, renamed, text_format, u8_workers):
+    from concurrent.futures import ProcessPoolExecutor
+
     if out_path is None:
         out_path = in_path + '.d'
-    decode_u8_node(out_path, root, retained, renamed)
-
-def decode(in_path, out_path, retained, renamed):
-    if in_path.endswith('.arc') or in_path.endswith('.szs') or in_path.endswith('.arc.lzma'):
-        decode_u8(in_path, out_path, retained, renamed)
+    name = renamed.get('', '')
+    # Directories are created up front, only the members themselves are converted in parallel
+    members = []
+    decode_u8_node(os.path.join(out_path, name), archive, '', retained, renamed, members)
+    if u8_workers == 1 or len(members) < 2:
+        for member_path, path in members:
+            decode_u8_member(member_path, archive.read(path), text_format)
         return
+
+    def calls():
+        for member_path, path in members:
+            in_data = archive.read(path)
+            if is_convertible(member_path, in_data):
+                yield member_path, decode_u8_member, member_path, bytes(in_data), text_format
+            else:
+                # Raw members like textures are written straight from the archive meanwhile,
+                # sending them to a worker would only copy them around
+                decode_u8_member(member_path, in_data, text_format)
+
+    workers = u8_workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers = workers) as executor:
+        for _, (_, records) in map_bounded(executor, workers, calls()):
+            timing.merge(records)
+
+def decode_file(in_path, out_path, text_format):
     ext = in_path.split(os.extsep)[-1]
     unpack = ext_unpack.get(ext)
     if unpack is None:
         sys.exit(f'Unknown file format with extension {ext}.')
-    with open(in_path, 'rb') as in_file:
-        in_data = in_file.read()
-    magic = in_data[0:4]
-    expected_magic = ext_magic[ext]
-    if magic != expected_magic:
-        magic = magic.decode('ascii')
-        expected_magic = expected_magic.decode('ascii')
-        sys.exit(f'Unexpected magic {magic} for extension {ext} (expected {expected_magic}).')
-    val = unpack(in_data)
-    out_data = json5.dumps(val, ensure_ascii = False, indent = 4, quote_keys = True)
+    with timing.stage('read', in_path) as stage:
+        with open(in_path, 'rb') as in_file:
+            stage.in_size = os.fstat(in_file.fileno()).st_size
+            in_data = map_file(in_file)
+        stage.out_size = len(in_data)
+    try:
+        magic = in_data[0:4]
+        expected_magic = ext_magic[ext]
+        if magic != expected_magic:
+            magic = magic.decode('ascii')
+            expected_magic = expected_magic.decode('ascii')
+            sys.exit(f'Unexpected magic {magic} for extension {ext} (expected {expected_magic}).')
+        serializer = serializers[text_format]
+        if out_path is None:
+            out_path = in_path + os.extsep + serializer.ext
+        write_val(out_path, ext, in_data, serializer, False)
+    finally:
+        close_map(in_data)
+
+def decode(in_path, out_path, retained, renamed, text_format = 'json5', u8_workers = None,
+           cache = None):
+    is_u8 = in_path.endswith('.arc') or in_path.endswith('.szs') or in_path.endswith('.arc.lzma')
     if out_path is None:
-        out_path = in_path + '.json5'
-    with open(out_path, 'w', encoding = 'utf-8') as out_file:
-        out_file.write(out_data)
+        if is_u8:
+            out_path = in_path + '.d'
+        else:
+            out_path = in_path + os.extsep + serializers[text_format].ext
+    if cache is not None:
+        from cache import file_digest
+
+        # Retained paths include the output directory, so it only matters when they are given
+        retained_key = None if retained is None else (out_path, sorted(retained))
+        key = cache.key('decode', in_path.split(os.extsep)[-1], file_digest(in_path), text_format,
+                        repr(retained_key), repr(sorted(renamed.items())))
+        if cache.get_tree(key, out_path):
+            return
+    if is_u8:
+        decode_u8(in_path, out_path, retained, renamed, text_format, u8_workers)
+    else:
+        decode_file(in_path, out_path, text_format)
+    if cache is not None:
+        cache.put_tree(key, out_path)
+
+def read_val(in_data, serializer):
+    if not serializer.binary:
+        in_data = in_data.decode('utf-8')
+    return serializer.loads(in_data)
+
+def read_file(in_path):
+    with timing.stage('read', in_path) as stage:
+        with open(in_path, 'rb') as in_file:
+            stage.in_size = os.fstat(in_file.fileno()).st_size
+            in_data = in_file.read()
+        stage.out_size = len(in_data)
+    return in_data
+
+def load_and_pack(in_path, in_data, serializer, pack):
+    with timing.stage('load', in_path, len(in_data)) as stage:
+        val = read_val(in_data, serializer)
+        stage.out_size = len(in_data)
+    with timing.stage('pack', in_path) as stage:
+        out_data = pack(val)
+        stage.in_size = stage.out_size = len(out_data)
+    return out_data
 
-def encode_u8_node(in_path, retained, renamed):
+def encode_u8_member(in_path, ext, cache):
+    pack = ext_pack.get(ext)
+    if pack is None:
+        return read_file(in_path)
+    text_ext = in_path.split(os.extsep)[-1]
+    serializer = ext_serializers[text_ext]
+    in_data = read_file(in_path)
+    if cache is None:
+        return load_and_pack(in_path, in_data, serializer, pack)
+    key = cache.key('member', ext, text_ext, in_data)
+    out_data = cache.get(key)
+    if out_data is None:
+        out_data = load_and_pack(in_path, in_data, serializer, pack)
+        cache.put(key, out_data)
+    return out_data
+
+def encode_u8_node(in_path, retained, renamed, members):
     is_dir = os.path.isdir(in_path)
     if is_dir:
         if retained is not None and not any(r.startswith(in_path) for r in retained):
@@ -116,7 +329,7 @@ def encode_u8_node(in_path, retained, renamed):
         out_path = in_path
         children = []
         for child_path in sorted(os.listdir(in_path)):
-            child = encode_u8_node(os.path.join(in_path, child_path), retained, renamed)
+            child = encode_u8_node(os.path.join(in_path, child_path), retained, renamed, members)
             if child is not None:
                 children += [child]
         node = {
@@ -126,79 +339,331 @@ def encode_u8_node(in_path, retained, renamed):
         if retained is not None and in_path not in retained:
             return None
         parts = in_path.split(os.extsep)
-        ext = parts[-2] if len(parts) >= 2 else None
-        pack = ext_pack.get(ext)
-        if pack is None:
-            with open(in_path, 'rb') as in_file:
-                out_data = in_file.read()
-            out_path = in_path
-        else:
-            with open(in_path, 'r', encoding = 'utf-8') as in_file:
-                in_data = in_file.read()
-            val = json5.loads(in_data)
-            out_data = pack(val)
+        ext = None
+        if len(parts) >= 2 and parts[-1] in ext_serializers:
+            ext = parts[-2]
+        if ext in ext_pack:
             out_path = os.path.splitext(in_path)[0]
+        else:
+            out_path = in_path
+        # The content is filled in by encode_u8 once the member has been converted
         node = {
-            'content': out_data,
+            'content': None,
         }
     name = os.path.basename(out_path)
     if name in renamed:
         name = renamed[name]
-    return {
+    node = {
         'is_dir': is_dir,
         'name': name,
         **node,
     }
+    if not is_dir:
+        members += [(node, in_path, ext)]
+    return node
+
+def encode_u8(in_path, out_path, retained, renamed, u8_workers, yaz_level, yaz_workers, cache):
+    from concurrent.futures import ProcessPoolExecutor
+    import lzma
+    from u8 import pack_u8
+    from yaz import pack_yaz
 
-def encode_u8(in_path, out_path, retained, renamed):
     ext = in_path.split(os.extsep)[-2]
-    root = encode_u8_node(in_path, retained, renamed)
-    out_data = pack_u8(root)
+    members = []
+    root = encode_u8_node(in_path, retained, renamed, members)
+    if u8_workers == 1 or len(members) < 2:
+        for node, member_path, member_ext in members:
+            node['content'] = encode_u8_member(member_path, member_ext, cache)
+    else:
+        def calls():
+            for node, member_path, member_ext in members:
+                if member_ext in ext_pack:
+                    yield node, encode_u8_member, member_path, member_ext, cache
+                else:
+                    # Raw members are read here meanwhile, a worker would only pickle them back
+                    node['content'] = encode_u8_member(member_path, member_ext, cache)
+
+        workers = u8_workers or os.cpu_count() or 1
+        with ProcessPoolExecutor(max_workers = workers) as executor:
+            for node, (content, records) in map_bounded(executor, workers, calls()):
+                node['content'] = content
+                timing.merge(records)
+    with timing.stage('u8 pack', in_path) as stage:
+        out_data = pack_u8(root)
+        stage.in_size = stage.out_size = len(out_data)
     if ext == 'szs':
-        out_data = pack_yaz(out_data)
+        with timing.stage('compress', in_path, len(out_data)) as stage:
+            out_data = pack_yaz(out_data, yaz_level, yaz_workers, cache)
+            stage.out_size = len(out_data)
     elif ext == 'lzma':
-        out_data = lzma.compress(out_data, lzma.FORMAT_ALONE)
+        with timing.stage('compress', in_path, len(out_data)) as stage:
+            out_data = lzma.compress(out_data, lzma.FORMAT_ALONE)
+            stage.out_size = len(out_data)
     if out_path is None:
         out_path = os.path.splitext(in_path)[0]
-    with open(out_path, 'wb') as out_file:
-        out_file.write(out_data)
+    with timing.stage('write', out_path, len(out_data)) as stage:
+        with open(out_path, 'wb') as out_file:
+            out_file.write(out_data)
+            stage.out_size = out_file.tell()
 
-def encode(in_path, out_path, retained, renamed):
+def encode(in_path, out_path, retained, renamed, u8_workers = None, yaz_level = 'max',
+           yaz_workers = None, cache = None):
     if in_path.endswith('.arc.d') or in_path.endswith('.szs.d') or in_path.endswith('.arc.lzma.d'):
-        encode_u8(in_path, out_path, retained, renamed)
+        encode_u8(in_path, out_path, retained, renamed, u8_workers, yaz_level, yaz_workers, cache)
         return
     ext = in_path.split(os.extsep)[-2]
     pack = ext_pack.get(ext)
     if pack is None:
         sys.exit(f'Unknown file format with binary extension {ext}.')
-    with open(in_path, 'r', encoding = 'utf-8') as in_file:
-        in_data = in_file.read()
-    val = json5.loads(in_data)
-    out_data = pack(val)
+    text_ext = in_path.split(os.extsep)[-1]
+    serializer = ext_serializers.get(text_ext)
+    if serializer is None:
+        sys.exit(f'Unknown text format with extension {text_ext}.')
+    in_data = read_file(in_path)
+    out_data = load_and_pack(in_path, in_data, serializer, pack)
     if out_path is None:
         out_path = os.path.splitext(in_path)[0]
-    with open(out_path, 'wb') as out_file:
-        out_file.write(out_data)
+    with timing.stage('write', out_path, len(out_data)) as stage:
+        with open(out_path, 'wb') as out_file:
+            out_file.write(out_data)
+            stage.out_size = out_file.tell()
 
 
-parser = ArgumentParser()
-parser.add_argument('operation', choices = ['decode', 'encode'])
-parser.add_argument('inputs', nargs = '+')
-parser.add_argument('-o', '--outputs', nargs = '*')
-parser.add_argument('--retained', nargs = '*')
-parser.add_argument('--renamed', action = 'append', nargs = 2)
-args = parser.parse_args()
+def watch(inputs, outputs, retained, renamed, u8_workers, yaz_level, yaz_workers, cache,
+          interval, debounce, poll):
+    from cache import MemoryCache
+    from watch import Watcher, signature
 
-operations = {
-    'decode': decode,
-    'encode': encode,
-}
-if args.outputs is None:
-    args.outputs = [None] * len(args.inputs)
-if len(args.outputs) != len(args.inputs):
-    sys.exit('Wrong number of output paths.')
-renamed = {}
-if args.renamed is not None:
-    renamed = {src: dst for src, dst in args.renamed}
-for in_path, out_path in zip(args.inputs, args.outputs):
-    operations[args.operation](in_path, out_path, args.retained, renamed)
+    # Without a cache directory, packed members and compressed chunks are kept in memory between
+    # builds, so that a save only repacks the member it touched and recompresses the chunks after it
+    memory_cache = None
+    if cache is None:
+        memory_cache = MemoryCache()
+        cache = memory_cache
+    watcher = Watcher(inputs, interval, poll)
+    signatures = [None] * len(inputs)
+    print(f'Watching {len(inputs)} inputs, stop with Ctrl+C.', file = sys.stderr)
+    try:
+        while True:
+            # Wait for a burst of saves to settle before building
+            current = [signature(in_path) for in_path in inputs]
+            while True:
+                time.sleep(debounce)
+                watcher.drain()
+                settled = [signature(in_path) for in_path in inputs]
+                if settled == current:
+                    break
+                current = settled
+            for i, (in_path, out_path) in enumerate(zip(inputs, outputs)):
+                if current[i] == signatures[i]:
+                    continue
+                signatures[i] = current[i]
+                if current[i] is None:
+                    continue
+                error, elapsed = run_job('encode', in_path, out_path, retained, renamed, None,
+                                         u8_workers, yaz_level, yaz_workers, cache)
+                if error is None:
+                    print(f'{elapsed:8.3f}s ok     {in_path}')
+                else:
+                    print(f'{elapsed:8.3f}s failed {in_path}: {error}')
+                sys.stdout.flush()
+            if memory_cache is not None:
+                memory_cache.sweep()
+            elif cache is not None:
+                cache.evict()
+            # Writing the outputs may have woken the watcher up, but saves made during the build
+            # must not be missed
+            watcher.drain()
+            if [signature(in_path) for in_path in inputs] == signatures:
+                watcher.wait()
+    except KeyboardInterrupt:
+        pass
+
+def run(operation, in_path, out_path, retained, renamed, text_format, u8_workers, yaz_level,
+        yaz_workers, cache):
+    if operation == 'decode':
+        decode(in_path, out_path, retained, renamed, text_format, u8_workers, cache)
+    else:
+        encode(in_path, out_path, retained, renamed, u8_workers, yaz_level, yaz_workers, cache)
+
+def run_job(*args):
+    # Report errors instead of raising them so that one failed file does not stop the others
+    start = time.perf_counter()
+    try:
+        run(*args)
+        error = None
+    except SystemExit as e:
+        error = str(e.code)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    return error, time.perf_counter() - start
+
+def run_inputs(args, renamed, cache):
+    if args.jobs is None:
+        for in_path, out_path in zip(args.inputs, args.outputs):
+            run(args.operation, in_path, out_path, args.retained, renamed, args.format,
+                args.u8_workers, args.yaz_level, args.yaz_workers, cache)
+        if cache is not None:
+            cache.evict()
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Files are already spread across processes, don't also spread each archive by default
+    u8_workers = args.u8_workers
+    if u8_workers is None:
+        u8_workers = 1
+    yaz_workers = args.yaz_workers
+    if yaz_workers is None:
+        yaz_workers = 1
+    is_timed = timing.is_enabled()
+    start = time.perf_counter()
+    failed_count = 0
+    with ProcessPoolExecutor(max_workers = args.jobs or None) as executor:
+        futures = [
+            executor.submit(timing.call, is_timed, run_job, args.operation, in_path, out_path,
+                            args.retained, renamed, args.format, u8_workers, args.yaz_level,
+                            yaz_workers, cache)
+            for in_path, out_path in zip(args.inputs, args.outputs)
+        ]
+        for in_path, future in zip(args.inputs, futures):
+            (error, elapsed), records = future.result()
+            timing.merge(records)
+            if error is None:
+                print(f'{elapsed:8.3f}s ok     {in_path}')
+            else:
+                failed_count += 1
+                print(f'{elapsed:8.3f}s failed {in_path}: {error}')
+    if cache is not None:
+        cache.evict()
+    elapsed = time.perf_counter() - start
+    print(f'{elapsed:8.3f}s {len(args.inputs)} files, {failed_count} failed')
+    if failed_count > 0:
+        sys.exit(1)
+
+def warm_up():
+    # What the one-shot CLI imports lazily is imported and compiled once here, so that the jobs
+    # which serve forks start with all of it
+    import concurrent.futures
+    import lzma
+
+    import brctr
+    import brlyt
+    import cache
+    import u8
+    import yaz
+
+    for ext in ext_unpack:
+        ext_unpack[ext]
+    for ext in ext_pack:
+        ext_pack[ext]
+    brctr.compile_schemas()
+    brlyt.compile_schemas()
+    for serializer in serializers.values():
+        serializer.import_modules()
+
+def main():
+    parser = ArgumentParser()
+    parser.add_argument('operation', choices = ['decode', 'encode', 'serve', 'watch'])
+    parser.add_argument('inputs', nargs = '*')
+    parser.add_argument('-o', '--outputs', nargs = '*')
+    parser.add_argument('--retained', nargs = '*')
+    parser.add_argument('--renamed', action = 'append', nargs = 2)
+    # Only used on decode, encode picks the parser from the extension (.json5, .json or .bin)
+    parser.add_argument('--format', '--to', choices = list(serializers), default = 'json5')
+    parser.add_argument('--u8-workers', type = int)
+    # One of yaz.levels, max by default, checked after parsing so that yaz is not imported for them
+    parser.add_argument('--yaz-level')
+    parser.add_argument('--yaz-workers', type = int)
+    # Decoded trees, packed archive members and compressed chunks are reused from there
+    parser.add_argument('--cache-dir')
+    # In MiB, the least recently used entries are evicted beyond it
+    parser.add_argument('--cache-size', type = int, default = 1024)
+    parser.add_argument('--cache-link', action = 'store_true')
+    # 0 jobs means one per core
+    parser.add_argument('-j', '--jobs', type = int)
+    # Unix socket for serve, wuj5c.py then runs the same commands without the import cost
+    parser.add_argument('--socket', help = 'socket of serve, $WUJ5_SOCKET or one in '
+                        '$XDG_RUNTIME_DIR or a private temp directory by default. serve is a fork '
+                        'server: each job starts with what serve imported and compiled, but keeps '
+                        'no state between jobs')
+    # In seconds, watch rebuilds once inputs have been left alone for debounce, polling every
+    # interval if inotify is not available or --poll is given
+    parser.add_argument('--interval', type = float, default = 0.5)
+    parser.add_argument('--debounce', type = float, default = 0.1)
+    parser.add_argument('--poll', action = 'store_true')
+    # Prints the time and bytes in and out of each stage on stderr. The trace has the same for
+    # each file and archive member as JSON, the cProfile stats and tracemalloc snapshot only
+    # cover the main process.
+    parser.add_argument('--profile', action = 'store_true')
+    parser.add_argument('--profile-trace')
+    parser.add_argument('--profile-cprofile')
+    parser.add_argument('--profile-tracemalloc')
+    # Intermixed so that options can still come before the inputs, which may be empty for serve
+    args = parser.parse_intermixed_args()
+
+    if args.operation == 'serve':
+        from server import default_socket_path, serve
+
+        warm_up()
+        serve(args.socket or default_socket_path(), main)
+        return
+    if not args.inputs:
+        parser.error('the following arguments are required: inputs')
+    for option, workers in [
+        ('-j/--jobs', args.jobs),
+        ('--u8-workers', args.u8_workers),
+        ('--yaz-workers', args.yaz_workers),
+    ]:
+        if workers is not None and workers < 0:
+            parser.error(f'argument {option}: must be at least 0, not {workers}')
+    if args.yaz_level is None:
+        args.yaz_level = 'max'
+    else:
+        from yaz import levels
+
+        if args.yaz_level not in levels:
+            choices = ', '.join(repr(level) for level in levels)
+            parser.error(f'argument --yaz-level: invalid choice: {args.yaz_level!r} (choose from '
+                         f'{choices})')
+    if args.format == 'orjson' and not has_orjson:
+        sys.exit('The orjson format needs the orjson package (pip install orjson), '
+                 '--format json writes the same files without it.')
+
+    if args.outputs is None:
+        args.outputs = [None] * len(args.inputs)
+    if len(args.outputs) != len(args.inputs):
+        sys.exit('Wrong number of output paths.')
+    renamed = {}
+    if args.renamed is not None:
+        renamed = {src: dst for src, dst in args.renamed}
+    cache = None
+    if args.cache_dir is not None:
+        from cache import Cache
+
+        cache = Cache(args.cache_dir, args.cache_size * 0x100000, args.cache_link)
+    if args.operation == 'watch':
+        # Members are packed in this process so that the in-memory cache keeps them
+        u8_workers = args.u8_workers
+        if u8_workers is None:
+            u8_workers = 1
+        watch(args.inputs, args.outputs, args.retained, renamed, u8_workers, args.yaz_level,
+              args.yaz_workers, cache, args.interval, args.debounce, args.poll)
+        return
+    is_profiling = args.profile or any(path is not None for path in [
+        args.profile_trace,
+        args.profile_cprofile,
+        args.profile_tracemalloc,
+    ])
+    if is_profiling:
+        timing.start(args.profile_cprofile, args.profile_tracemalloc)
+    try:
+        run_inputs(args, renamed, cache)
+    finally:
+        if is_profiling:
+            timing.stop(args.profile, args.profile_trace, args.profile_cprofile,
+                        args.profile_tracemalloc)
+
+
+if __name__ == '__main__':
+    main()
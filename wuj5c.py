@@ -0,0 +1,12 @@
+#!/usr/bin/env python3
+
+
+# Thin client for wuj5.py serve: takes the same arguments as wuj5.py and exits the same way, in a
+# process forked from the server rather than a new interpreter
+import sys
+
+from server import default_socket_path, request
+
+
+if __name__ == '__main__':
+    sys.exit(request(default_socket_path(), 'wuj5.py', sys.argv[1:]))